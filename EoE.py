@@ -1,32 +1,23 @@
 import streamlit as st
-import numpy as np
-import pandas as pd
-import altair as alt
 
-# Coefficients (from logistic regression)
-coef_str = [0.044]
-intercept_str = -3.9
-coef_dil = [0.041]
-intercept_dil = -3.7
-coef_rng = [0.034]
-intercept_rng = -2.1
+from instrumentation import span, start_rerun, finish_rerun
+from page_charts import eoe_base_chart, eoe_chart
+from sweep import sweep_panel
+from eoe_model import calculate_scores, predict_probability, INTERVAL_OUTPUTS, predict_interval
+from percentile_index import load_index, ordinal
 
-def calculate_scores(age, duration, eos, fib, remodel):
-    age_scaled = min(age // 10, 8)
-    duration_scaled = min(duration, 15)
-    eos_scaled = min(eos // 10, 10)
-    fib_scaled = min(fib // 10, 30)
-    remodel_scaled = min(remodel // 100, 50)
+start_rerun('eoe')
 
-    score_str = fib_scaled * 2 + eos_scaled * 1 + age_scaled * 2 + duration_scaled * 4 + remodel_scaled * 1
-    score_dil = fib_scaled * 2 + eos_scaled * 1 + age_scaled * 2 + duration_scaled * 4 + remodel_scaled * 1
-    score_rng = fib_scaled * 1 + eos_scaled * 2 + age_scaled * 1 + duration_scaled * 1 + remodel_scaled * 1
+# The probability curves and the reference cohort's histogram do not depend on
+# the inputs, so they are built once per process (see page_charts.py) and reused
+# on every rerun
+build_base_chart = st.cache_resource(eoe_base_chart)
 
-    return score_str, score_dil, score_rng
-
-def predict_probability(score, coef, intercept):
-    log_odds = coef[0] * score + intercept
-    return 1 / (1 + np.exp(-log_odds))
+# "12.3%", with its 95% confidence interval when there is one
+def describe(p, interval):
+    if interval is None:
+        return f"{p:.1%}"
+    return f"{p:.1%} (95% CI {interval[0]:.1%}–{interval[1]:.1%})"
 
 st.title("EoE Fibrosis Risk Calculator")
 st.markdown("Estimates risk of **Strictures**, **Strictures + Dilation**, and **Rings** based on clinical and histologic data.")
@@ -37,41 +28,46 @@ eos = st.slider("Eosinophils per HPF", 0, 100, 40)
 fib = st.slider("AI Fibrosis Score", 0, 300, 60)
 remodel = st.slider("Remodeling Score 3 (Fib score x Basal %)", 0, 5000, 1000)
 
-score_str, score_dil, score_rng = calculate_scores(age, duration, eos, fib, remodel)
-p_str = predict_probability(score_str, coef_str, intercept_str)
-p_dil = predict_probability(score_dil, coef_dil, intercept_dil)
-p_rng = predict_probability(score_rng, coef_rng, intercept_rng)
+with span('scoring'):
+    score_str, score_dil, score_rng = calculate_scores(age, duration, eos, fib, remodel)
+with span('lookup'):
+    p_str = predict_probability(score_str, 'p_str')
+    p_dil = predict_probability(score_dil, 'p_dil')
+    p_rng = predict_probability(score_rng, 'p_rng')
+    intervals = {
+        output: predict_interval(score, output)
+        for output, score in (('p_str', score_str), ('p_dil', score_dil), ('p_rng', score_rng))
+        if output in INTERVAL_OUTPUTS
+    }
+    index = load_index('eoe')
+    percentile = index.percentile(score_str) if index is not None else None
 
 st.subheader("Predicted Probabilities")
-st.write(f"**Stricture**: {p_str:.1%} (Score = {score_str})")
-st.write(f"**Stricture + Dilation**: {p_dil:.1%} (Score = {score_dil})")
-st.write(f"**Rings**: {p_rng:.1%} (Score = {score_rng})")
+st.write(f"**Stricture**: {describe(p_str, intervals.get('p_str'))} (Score = {score_str})")
+st.write(f"**Stricture + Dilation**: {describe(p_dil, intervals.get('p_dil'))} (Score = {score_dil})")
+st.write(f"**Rings**: {describe(p_rng, intervals.get('p_rng'))} (Score = {score_rng})")
+if percentile is not None:
+    st.write(f"Stricture Score Percentile: {ordinal(percentile)} of {len(index):,} reference patients")
 
 st.header("Risk Probability Plot")
-score_range = np.arange(0, 601)
-prob_df = pd.DataFrame({
-    "Risk Score": score_range,
-    "Stricture": predict_probability(score_range, coef_str, intercept_str),
-    "Stricture + Dilation": predict_probability(score_range, coef_dil, intercept_dil),
-    "Rings": predict_probability(score_range, coef_rng, intercept_rng)
-})
-melted = prob_df.melt(id_vars="Risk Score", var_name="Outcome", value_name="Probability")
+with span('data_prep'):
+    base, distribution = build_base_chart()
+
+with span('chart'):
+    chart = eoe_chart(
+        base,
+        {'p_str': score_str, 'p_dil': score_dil, 'p_rng': score_rng},
+        {'p_str': p_str, 'p_dil': p_dil, 'p_rng': p_rng},
+        intervals,
+        distribution
+    )
 
-base = alt.Chart(melted).mark_line().encode(
-    x="Risk Score",
-    y="Probability",
-    color="Outcome"
-)
+with span('render'):
+    st.altair_chart(chart, use_container_width=True)
 
-dots = alt.Chart(pd.DataFrame({
-    "Risk Score": [score_str, score_dil, score_rng],
-    "Probability": [p_str, p_dil, p_rng],
-    "Outcome": ["Stricture", "Stricture + Dilation", "Rings"]
-})).mark_point(size=100).encode(
-    x="Risk Score",
-    y="Probability",
-    color="Outcome",
-    tooltip=["Outcome", "Risk Score", "Probability"]
-)
+with span('sweep'):
+    sweep_panel('eoe', {
+        'age': age, 'duration': duration, 'eos': eos, 'fib': fib, 'remodel': remodel
+    }, {'p_str': 'Stricture', 'p_dil': 'Stricture + Dilation', 'p_rng': 'Rings'})
 
-st.altair_chart(base + dots, use_container_width=True)
+finish_rerun()
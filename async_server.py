@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+
+from server import LINGER, content_length, encode_json, handle
+
+# The JSON API of server.py on an asyncio event loop instead of one thread per
+# connection, for bursts of many simultaneous users. Routing and scoring are the
+# same pure functions (server.handle), so both servers answer identically.
+#
+#   python async_server.py --port 8000
+#   python async_server.py --port 8000 --workers 4
+#
+# A single patient is scored in microseconds, so those requests are answered
+# directly on the loop. Requests with large bodies (batches) are handed to a
+# worker thread, where the vectorized scorers release the GIL for most of their
+# work, so one big batch does not stall every other connection. --workers runs
+# that many server processes on the same port (SO_REUSEPORT), one per CPU.
+
+# Bodies up to this size are handled on the event loop
+INLINE_BODY_LIMIT = 64 * 1024
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 411: 'Length Required', 413: 'Payload Too Large',
+    501: 'Not Implemented',
+}
+
+async def serve_connection(reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            # readline raises ValueError for lines longer than the stream limit
+            try:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+            except (ValueError, asyncio.LimitOverrunError):
+                await reject(reader, writer, 400, {'error': "Request line or header too long."})
+                break
+            try:
+                method, path, version = request_line.decode('latin-1').split()
+            except ValueError:
+                await reject(reader, writer, 400, {'error': "Malformed request line."})
+                break
+
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+            length, error = content_length(headers.get('content-length'), headers.get('transfer-encoding'))
+            if error:
+                await reject(reader, writer, *error)
+                break
+            body = await reader.readexactly(length) if length else b''
+
+            if length > INLINE_BODY_LIMIT:
+                status, payload = await loop.run_in_executor(None, handle_encoded, method, path, body)
+            else:
+                status, payload = handle_encoded(method, path, body)
+            await respond(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+# Answer a request that cannot be read and close the connection. The rest of the
+# request is read and dropped first (for at most LINGER seconds): closing with
+# unread data in the socket resets the connection and discards the response.
+async def reject(reader, writer, status, payload):
+    await respond(writer, status, payload, keep_alive=False)
+    try:
+        writer.write_eof()
+        async with asyncio.timeout(LINGER):
+            while await reader.read(64 * 1024):
+                pass
+    except (TimeoutError, ConnectionError, OSError):
+        pass
+
+def handle_encoded(method, path, body):
+    status, payload = handle(method, path, body)
+    return status, encode_json(payload)
+
+async def respond(writer, status, body, keep_alive):
+    if not isinstance(body, bytes):
+        body = encode_json(body)
+    writer.write(
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+
+async def serve(host, port, reuse_port=False):
+    server = await asyncio.start_server(serve_connection, host, port, reuse_port=reuse_port or None, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+def run(host, port, reuse_port=False):
+    try:
+        asyncio.run(serve(host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the HCC and EoE calculators as a JSON API on asyncio.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help="server processes sharing the port (0: one per CPU)")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count()
+    print(f"Serving on http://{args.host}:{args.port} with {workers} worker{'s' if workers > 1 else ''}")
+    if workers == 1:
+        run(args.host, args.port)
+        return
+    processes = [multiprocessing.Process(target=run, args=(args.host, args.port, True)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+if __name__ == '__main__':
+    main()
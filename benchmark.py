@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import dfs_model
+import eoe_model
+import os_model
+import recmet_model
+from input_space import GRIDS
+
+# Repeatable benchmarks for scoring, probability lookup, chart construction and
+# full Streamlit reruns. Results are saved as JSON so runs on different commits
+# can be compared; --compare exits with status 1 when any benchmark's throughput
+# drops by more than --threshold against a saved run:
+#
+#   python benchmark.py --output before.json
+#   python benchmark.py --output after.json --compare before.json --threshold 0.2
+
+DEFAULT_SIZES = [1, 1_000, 1_000_000]
+PAGES = {'recmet': 'app.py', 'dfs': 'DFS.py', 'os': 'OS.py', 'eoe': 'EoE.py'}
+EOE_RANGES = {'age': 80, 'duration': 15, 'eos': 100, 'fib': 300, 'remodel': 5000}
+HCC_MODULES = {'recmet': recmet_model, 'dfs': dfs_model, 'os': os_model}
+
+# Random cohort of n patients keyed by the model's INPUT_COLUMNS, drawn from the
+# ranges the calculator widgets allow
+def make_cohort(name, n, seed=0):
+    rng = np.random.default_rng(seed)
+    if name == 'eoe':
+        return {column: rng.integers(0, high + 1, n) for column, high in EOE_RANGES.items()}
+    cohort = {}
+    for column, kind, values in GRIDS[name]:
+        if kind == 'category':
+            cohort[column] = np.asarray(values)[rng.integers(0, len(values), n)]
+        elif kind == 'band':
+            cohort[column] = rng.uniform(0, 40, n).round()
+        else:
+            cohort[column] = rng.integers(0, values + 1, n)
+    return cohort
+
+def _rows(cohort, columns):
+    return list(zip(*(cohort[column].tolist() for column in columns)))
+
+HCC_BENCHMARKS = ['calculate_risk_score', 'calculate_risk_scores', 'get_risk_probability', 'prob_table.lookup']
+EOE_BENCHMARKS = ['calculate_scores', 'calculate_scores_batch', 'predict_probability', 'predict_probability.array']
+
+# Whether --select keeps any of these benchmarks, given as (name, size). Checked
+# before a benchmark's data is built, so a selection skips the 1M-row cohorts
+# of the other benchmarks.
+def _selected(select, benchmarks):
+    return not select or any(select in f'{name}[{size}]' for name, size in benchmarks)
+
+# Scoring and lookup benchmarks: (name, size, function timed once per call)
+def scoring_benchmarks(sizes, select=None):
+    for size in sizes:
+        for name, model in HCC_MODULES.items():
+            if not _selected(select, [(f'{name}.{benchmark}', size) for benchmark in HCC_BENCHMARKS]):
+                continue
+            cohort = make_cohort(name, size)
+            rows = _rows(cohort, model.INPUT_COLUMNS)
+            scores = model.calculate_risk_scores(*(cohort[column] for column in model.INPUT_COLUMNS))
+            score_list = scores.tolist()
+            get_probability = (
+                (lambda score, m=model: m.get_risk_probability(score, 3)) if name == 'recmet'
+                else model.get_risk_probabilities
+            )
+
+            yield f'{name}.calculate_risk_score', size, lambda m=model, r=rows: [m.calculate_risk_score(*row) for row in r]
+            yield f'{name}.calculate_risk_scores', size, lambda m=model, c=cohort: m.calculate_risk_scores(*(c[k] for k in m.INPUT_COLUMNS))
+            yield f'{name}.get_risk_probability', size, lambda f=get_probability, s=score_list: [f(score) for score in s]
+            yield f'{name}.prob_table.lookup', size, lambda m=model, s=scores: m.prob_table.lookup(s, 3, 'nan')
+
+        if not _selected(select, [(f'eoe.{benchmark}', size) for benchmark in EOE_BENCHMARKS]):
+            continue
+        cohort = make_cohort('eoe', size)
+        rows = _rows(cohort, eoe_model.INPUT_COLUMNS)
+        score_str = eoe_model.calculate_scores_batch(*(cohort[column] for column in eoe_model.INPUT_COLUMNS))[0]
+        score_list = score_str.tolist()
+        yield 'eoe.calculate_scores', size, lambda r=rows: [eoe_model.calculate_scores(*row) for row in r]
+        yield 'eoe.calculate_scores_batch', size, lambda c=cohort: eoe_model.calculate_scores_batch(*(c[k] for k in eoe_model.INPUT_COLUMNS))
+        yield 'eoe.predict_probability', size, lambda s=score_list: [
+            eoe_model.predict_probability(score, 'p_str') for score in s
+        ]
+        yield 'eoe.predict_probability.array', size, lambda s=score_str: eoe_model.predict_probability(s, 'p_str')
+
+# The pages' own chart construction (page_charts.py) on a cold cache: the base
+# charts, then the layers for the page's default patient, serialized to the
+# Vega-Lite JSON that is sent to the browser
+def chart_benchmarks(select=None):
+    try:
+        import page_charts
+    except ImportError:
+        return
+
+    def recmet_charts():
+        base, distribution = page_charts.recmet_base_chart()
+        probabilities = [recmet_model.get_risk_probability(0, year) for year in (3, 5)]
+        return page_charts.hcc_chart(base, 0, 'Probability', probabilities, ['3-Year', '5-Year'], distribution).to_json()
+
+    def dfs_charts():
+        base_risk, base_dfs, distribution = page_charts.dfs_base_charts()
+        risk_3yr, risk_5yr, dfs_3yr, dfs_5yr = dfs_model.get_risk_probabilities(0)
+        return [
+            page_charts.hcc_chart(base_risk, 0, 'Probability', [risk_3yr, risk_5yr], ['3-Year Any Event Risk', '5-Year Any Event Risk'], distribution).to_json(),
+            page_charts.hcc_chart(base_dfs, 0, 'DFS Probability', [dfs_3yr, dfs_5yr], ['3-Year DFS', '5-Year DFS']).to_json(),
+        ]
+
+    def os_charts():
+        base_risk, base_survival, distribution = page_charts.os_base_charts()
+        risk_3yr, risk_5yr, survival_3yr, survival_5yr = os_model.get_risk_probabilities(0)
+        return [
+            page_charts.hcc_chart(base_risk, 0, 'Probability', [risk_3yr, risk_5yr], ['3-Year Death Risk', '5-Year Death Risk'], distribution).to_json(),
+            page_charts.hcc_chart(base_survival, 0, 'Survival Probability', [survival_3yr, survival_5yr], ['3-Year Survival', '5-Year Survival']).to_json(),
+        ]
+
+    def eoe_charts():
+        base, distribution = page_charts.eoe_base_chart()
+        patient = eoe_model.score_patient(25, 3, 40, 60, 1000)
+        scores = {output: patient[f'score_{output[2:]}'] for output in ('p_str', 'p_dil', 'p_rng')}
+        probabilities = {output: patient[output] for output in scores}
+        intervals = {output: eoe_model.predict_interval(scores[output], output) for output in eoe_model.INTERVAL_OUTPUTS}
+        return page_charts.eoe_chart(base, scores, probabilities, intervals, distribution).to_json()
+
+    for name, function in (('recmet', recmet_charts), ('dfs', dfs_charts), ('os', os_charts), ('eoe', eoe_charts)):
+        if _selected(select, [(f'{name}.chart', 1)]):
+            yield f'{name}.chart', 1, function
+
+# Bytes of chart data Streamlit sends per page: on the first run and after one
+# slider interaction, with curves inline and with static file serving
+def chart_payloads():
+    try:
+        import streamlit as st
+        from streamlit import config
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {}
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def chart_bytes(app):
+        return sum(node.proto.ByteSize() for node in app.main.children.values() if getattr(node, 'type', None) == 'vega_lite_chart')
+
+    payloads = {}
+    static_serving = config.get_option('server.enableStaticServing')
+    try:
+        for mode, enabled in (('inline', False), ('static', True)):
+            config.set_option('server.enableStaticServing', enabled)
+            st.cache_resource.clear()
+            for name, page in PAGES.items():
+                app = AppTest.from_file(os.path.join(here, page), default_timeout=60)
+                app.run()
+                first = chart_bytes(app)
+                slider = app.slider[-1]
+                slider.set_value(slider.max if slider.value != slider.max else slider.min).run()
+                payloads[f'{name}.{mode}'] = {'first_run': first, 'interaction': chart_bytes(app)}
+    finally:
+        config.set_option('server.enableStaticServing', static_serving)
+        st.cache_resource.clear()
+    return payloads
+
+# Server memory through real browser sessions (see streamlit_client.py): the
+# RSS of a fresh server, and per page the RSS added by its first visit and by
+# each further open session. Linux only, as it reads /proc.
+def session_memory(sessions=100):
+    try:
+        from streamlit_client import Server, session_memory as measure_page
+    except ImportError:
+        return {}
+    with Server() as server:
+        memory = {'server.baseline': {'rss': server.rss()}}
+        for name in PAGES:
+            memory[f'{name}.sessions'] = measure_page(server, name, sessions)
+    return memory
+
+# One full rerun of each calculator page through Streamlit's AppTest harness
+def rerun_benchmarks(select=None):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name, page in PAGES.items():
+        if not _selected(select, [(f'{name}.rerun', 1)]):
+            continue
+        app = AppTest.from_file(os.path.join(here, page), default_timeout=60)
+        app.run()
+        yield f'{name}.rerun', 1, app.run
+
+# Best time per call over `repeat` rounds, each looping until it takes min_time.
+# Calls slower than a second get only two rounds to keep 1M-row runs bearable.
+def measure(function, repeat=5, min_time=0.1):
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed / loops
+    if elapsed > 1:
+        repeat = min(repeat, 2)
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+def run(sizes=DEFAULT_SIZES, select=None, repeat=5, min_time=0.1):
+    results = {}
+    groups = [scoring_benchmarks(sizes, select), chart_benchmarks(select), rerun_benchmarks(select)]
+    for group in groups:
+        for name, size, function in group:
+            key = f'{name}[{size}]'
+            if select and select not in key:
+                continue
+            seconds = measure(function, repeat, min_time)
+            results[key] = {'name': name, 'size': size, 'seconds': seconds, 'items_per_second': size / seconds}
+            print(f"{key:<45} {seconds * 1e3:>12.4f} ms {size / seconds:>16,.0f} items/s", file=sys.stderr)
+    return results
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+# Payloads whose bytes per interaction grew more than `threshold` (a fraction) over the baseline
+def find_payload_regressions(payloads, baseline, threshold):
+    regressions = []
+    for key, payload in payloads.items():
+        if key in baseline:
+            ratio = payload['interaction'] / baseline[key]['interaction']
+            if ratio > 1 + threshold:
+                regressions.append((key, ratio))
+    return regressions
+
+# Benchmarks whose throughput fell more than `threshold` (a fraction) below the baseline
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for key, result in results.items():
+        if key in baseline:
+            ratio = result['items_per_second'] / baseline[key]['items_per_second']
+            if ratio < 1 - threshold:
+                regressions.append((key, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the calculators and compare against a saved run.")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file from an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed throughput drop as a fraction (default: %(default)s)")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="comma-separated cohort sizes (default: %(default)s)")
+    parser.add_argument('--select', help="only run benchmarks whose name contains this string")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.1, help="seconds per timing round (default: %(default)s)")
+    parser.add_argument('--payloads', action='store_true', help="also measure chart bytes sent per page and interaction")
+    parser.add_argument('--memory', type=int, metavar='SESSIONS', help="also measure server RSS per page with this many open sessions")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    # The pages rendered below write their static curve tables (see charts.py) to
+    # a scratch directory, inherited by the server session_memory starts, rather
+    # than to the repository's static/
+    with tempfile.TemporaryDirectory() as static_dir:
+        os.environ['CALCULATOR_STATIC_DIR'] = static_dir
+        results = run(sizes, args.select, args.repeat, args.min_time)
+        payloads = chart_payloads() if args.payloads else {}
+        for key, payload in payloads.items():
+            print(f"{key:<45} {payload['first_run']:>12,} B first run {payload['interaction']:>10,} B per interaction", file=sys.stderr)
+        memory = session_memory(args.memory) if args.memory else {}
+        for key, usage in memory.items():
+            print(f"{key:<45} " + ' '.join(f"{value / 1024:>12,.0f} KB {field.replace('_', ' ')}" for field, value in usage.items()), file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': metadata(), 'results': results, 'payloads': payloads, 'memory': memory}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        regressions = find_regressions(results, saved['results'], args.threshold)
+        for key, ratio in regressions:
+            print(f"REGRESSION {key}: {ratio:.0%} of baseline throughput", file=sys.stderr)
+        payload_regressions = find_payload_regressions(payloads, saved.get('payloads', {}), args.threshold)
+        for key, ratio in payload_regressions:
+            print(f"REGRESSION {key}: {ratio:.0%} of baseline bytes per interaction", file=sys.stderr)
+        regressions += payload_regressions
+        if regressions:
+            sys.exit(1)
+        print(f"No throughput regressions beyond {args.threshold:.0%}.", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
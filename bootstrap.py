@@ -0,0 +1,77 @@
+import functools
+import os
+
+import numpy as np
+
+from spec_engine import logistic
+
+# Confidence intervals for logistic probability mappings, from the uncertainty of
+# their (coef, intercept). A spec supplies either bootstrap replicates of the fit
+# or the coefficient covariance, from which replicates are drawn once (see the
+# "logistic" mapping in spec_engine.py).
+#
+# The replicates are evaluated over the whole score grid in one
+# (replicates x scores) matrix operation and the percentiles of each column are
+# kept, so a patient's interval is an index into two arrays. Both the replicates
+# and the interval tables are computed once per process and cached.
+
+DRAWS = 2000
+SEED = 0
+LEVEL = 0.95
+# Scores the intervals are tabulated for; the EoE charts span the same range
+SCORE_GRID = np.arange(0, 601)
+
+# True when a probability mapping comes with the uncertainty needed for intervals
+def has_uncertainty(probability):
+    logistic_fit = probability.get('logistic', {})
+    return 'replicates' in logistic_fit or 'covariance' in logistic_fit
+
+# (replicates, 2) array of (coef, intercept) pairs for one output, read-only
+@functools.lru_cache(maxsize=None)
+def replicate_matrix(model, output):
+    fit = model.probability(output).get('logistic', {})
+    if 'replicates' in fit:
+        path = os.path.join(model.spec_dir, fit['replicates'])
+        if path.endswith('.npy'):
+            replicates = np.load(path)
+        else:
+            replicates = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+    elif 'covariance' in fit:
+        rng = np.random.default_rng(fit.get('seed', SEED))
+        replicates = rng.multivariate_normal([fit['coef'], fit['intercept']], fit['covariance'], size=fit.get('draws', DRAWS))
+    else:
+        raise ValueError(f"{model.name!r} has no replicates or covariance for {output!r}.")
+
+    replicates = np.ascontiguousarray(replicates, dtype=float)
+    if replicates.ndim != 2 or replicates.shape[1] != 2 or len(replicates) < 2:
+        raise ValueError(f"Replicates for {output!r} must be two or more (coef, intercept) rows, got shape {replicates.shape}.")
+    replicates.flags.writeable = False
+    return replicates
+
+# Lower and upper probability at every score in SCORE_GRID. The percentiles are
+# taken on the log-odds, which the logistic function maps to the same order.
+@functools.lru_cache(maxsize=None)
+def interval_table(model, output, level=LEVEL):
+    replicates = replicate_matrix(model, output)
+    log_odds = np.multiply.outer(replicates[:, 0], SCORE_GRID) + replicates[:, 1:]
+    lower, upper = logistic(np.quantile(log_odds, [(1 - level) / 2, (1 + level) / 2], axis=0), 1, 0)
+    lower.flags.writeable = False
+    upper.flags.writeable = False
+    return lower, upper
+
+# (lower, upper) for one score or an array of scores. Whole scores on the grid
+# are looked up in the interval table; any others are evaluated on the replicates.
+def predict_interval(model, output, score, level=LEVEL):
+    scores = np.asarray(score, dtype=float)
+    on_grid = (scores == np.floor(scores)) & (scores >= SCORE_GRID[0]) & (scores <= SCORE_GRID[-1])
+    if on_grid.all():
+        lower, upper = interval_table(model, output, level)
+        index = scores.astype(np.int64) - SCORE_GRID[0]
+        lower, upper = lower[index], upper[index]
+    else:
+        replicates = replicate_matrix(model, output)
+        log_odds = np.multiply.outer(replicates[:, 0], scores) + replicates[:, 1].reshape((-1,) + (1,) * scores.ndim)
+        lower, upper = logistic(np.quantile(log_odds, [(1 - level) / 2, (1 + level) / 2], axis=0), 1, 0)
+    if scores.ndim == 0:
+        return float(lower), float(upper)
+    return lower, upper
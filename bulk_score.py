@@ -0,0 +1,129 @@
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+import scoring
+
+# Score registry extracts too large to hold in memory. The input is read in
+# chunks, each chunk is scored with the vectorized scorers and written out
+# before the next one is read, so peak memory depends on --chunksize only.
+#
+#   python bulk_score.py os cohort.csv scored.csv
+#   python bulk_score.py eoe cohort.parquet scored.parquet --chunksize 500000
+#   python bulk_score.py dfs cohort.parquet scored.parquet --workers 8
+#   python bulk_score.py os cohort.parquet scored.parquet --store results/
+#
+# Input columns must be named after the model's INPUT_COLUMNS; the model's
+# OUTPUT_COLUMNS are appended to every row. With --store, only rows whose inputs
+# or model changed since the last run are scored (see incremental.py).
+
+DEFAULT_CHUNKSIZE = 100_000
+
+def is_parquet(path):
+    return str(path).endswith(('.parquet', '.pq'))
+
+def import_parquet():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Reading or writing Parquet requires pyarrow (pip install pyarrow).") from None
+    return pa, pq
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    if is_parquet(path):
+        _, pq = import_parquet()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+def score_chunk(name, chunk):
+    return chunk.assign(**scoring.get_model(name).score_batch(chunk))
+
+# Write scored chunks as they arrive and return the number of rows written.
+# The Parquet schema is taken from the first chunk with rows, as an empty chunk's
+# text columns have no type, and later chunks are cast to it: a column with no
+# values in one chunk (read from CSV as all-NaN float64) is written as nulls.
+def write_chunks(path, chunks):
+    rows = 0
+    if is_parquet(path):
+        pa, pq = import_parquet()
+        writer = None
+        empty = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None and not len(chunk):
+                    empty = table
+                    continue
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                elif not table.schema.equals(writer.schema):
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+            # Only empty chunks: the file still gets their columns
+            if writer is None and empty is not None:
+                writer = pq.ParquetWriter(path, empty.schema)
+                writer.write_table(empty)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(path, 'w', newline='') as f:
+            header = True
+            for chunk in chunks:
+                chunk.to_csv(f, header=header, index=False)
+                header = False
+                rows += len(chunk)
+    return rows
+
+def run(name, input_path, output_path, chunksize=DEFAULT_CHUNKSIZE):
+    scoring.get_model(name)
+    chunks = (score_chunk(name, chunk) for chunk in iter_chunks(input_path, chunksize))
+    return write_chunks(output_path, chunks)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV or Parquet cohort file in bounded memory.")
+    parser.add_argument('model', choices=sorted(scoring.MODELS))
+    parser.add_argument('input', help="CSV or Parquet (.parquet/.pq) file")
+    parser.add_argument('output', help="CSV or Parquet (.parquet/.pq) file to write")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=1, help="score partitions on this many processes (0: one per CPU)")
+    parser.add_argument('--store', help="result store directory (Parquet); only rows whose inputs or model changed are re-scored")
+    parser.add_argument('--id-column', default='patient_id', help="patient ID column keying the store (default: %(default)s)")
+    parser.add_argument('--changed-only', action='store_true', help="with --store, write only the re-scored rows")
+    parser.add_argument('--prune', action='store_true', help="with --store, drop stored patients missing from the input")
+    args = parser.parse_args(argv)
+    if args.store and args.workers != 1:
+        parser.error("--store cannot be combined with --workers.")
+    if args.changed_only and not args.store:
+        parser.error("--changed-only requires --store.")
+    if args.prune and not args.store:
+        parser.error("--prune requires --store.")
+
+    start = time.perf_counter()
+    skipped = None
+    # Rows the model cannot score, such as a missing r-RPA, stop the run
+    try:
+        if args.store:
+            import incremental
+            rows, skipped = incremental.run(args.model, args.input, args.output, args.store, args.id_column, args.chunksize,
+                                            args.changed_only, args.prune)
+        elif args.workers == 1:
+            rows = run(args.model, args.input, args.output, args.chunksize)
+        else:
+            from parallel import run_parallel
+            rows = run_parallel(args.model, args.input, args.output, args.chunksize, args.workers or None)
+    except ValueError as error:
+        raise SystemExit(f"{args.input}: {error}") from None
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows:,} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)", file=sys.stderr)
+    if skipped is not None:
+        print(f"Skipped {skipped:,} unchanged rows", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
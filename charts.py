@@ -0,0 +1,127 @@
+import json
+import os
+
+import altair as alt
+import streamlit as st
+
+# Compact chart specs for the calculator pages. Every rerun sends the whole
+# Vega-Lite spec to the browser, so the curves are kept as small as possible:
+#
+#   - HCC tables are sent wide, one row per score, and folded into one line per
+#     year in the browser; survival curves are computed there as 100 - risk
+#     instead of being shipped as extra columns.
+#   - With Streamlit's static file serving on (the default, set in
+#     .streamlit/config.toml), the tables are written once to static/ and the
+#     specs only refer to them by URL, so the browser downloads each table once
+#     and reruns carry the chart layout and the patient markers only. Without
+#     it the tables are sent inline on every rerun.
+#   - Patient markers are sent as inline JSON values in the spec; a one-row
+#     DataFrame would be sent as an Arrow table whose schema alone is over 1 KB.
+#   - EoE curves are logistic functions of the score, so the browser evaluates
+#     them from the coefficients and no curve data is sent at all.
+
+# Where the tables are written for static serving. Rendering a page writes them,
+# so a deployment whose source tree is read-only can set CALCULATOR_STATIC_DIR
+# to a writable directory; Streamlit only serves the static/ folder next to the
+# app, so static/ must then be a link to it. The benchmarks use a scratch
+# directory. Everything written here can be downloaded by anyone who can reach
+# the server, so only the models' curve tables are published.
+STATIC_DIR = os.environ.get(
+    'CALCULATOR_STATIC_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+)
+
+# Curve data for a chart: the DataFrame itself, or a URL when static serving is on
+def curve_source(name, df):
+    if not st.get_option('server.enableStaticServing'):
+        return df
+    text = df.to_json(orient='records', double_precision=15)
+    path = os.path.join(STATIC_DIR, f'{name}.json')
+    try:
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        if _read(path) != text:
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as f:
+                f.write(text)
+            os.replace(temporary, path)
+    except OSError:
+        return df
+    return alt.UrlData(f'app/static/{name}.json', format=alt.JsonDataFormat(type='json'))
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+# One line per table column, folded into Year/Probability in the browser.
+# complement names a field computed as 100 - Probability and plotted instead.
+def table_curves(source, columns, title, complement=None):
+    chart = alt.Chart(source).transform_fold(columns, as_=['Year', 'Probability'])
+    y = 'Probability'
+    if complement:
+        chart = chart.transform_calculate(**{complement: '100 - datum.Probability'})
+        y = complement
+    return chart.mark_line().encode(
+        x='Risk Score:Q',
+        y=f'{y}:Q',
+        color='Year:N'
+    ).properties(
+        title=title
+    )
+
+# Logistic curves 1 / (1 + exp(-(coef * score + intercept))) over scores
+# start..stop - 1, evaluated in the browser. curves maps each outcome to its
+# (coef, intercept).
+def logistic_curves(curves, start, stop):
+    calculations = {
+        outcome: f'1 / (1 + exp(-({json.dumps(coef)} * datum["Risk Score"] + {json.dumps(intercept)})))'
+        for outcome, (coef, intercept) in curves.items()
+    }
+    return alt.Chart(alt.sequence(start, stop, as_='Risk Score')).transform_calculate(
+        **calculations
+    ).transform_fold(
+        list(curves), as_=['Outcome', 'Probability']
+    ).mark_line().encode(
+        x='Risk Score:Q',
+        y='Probability:Q',
+        color='Outcome:N'
+    )
+
+# Shaded confidence bands between the Lower and Upper fields, coloured by Outcome
+# to match the curves they are layered with
+def interval_bands(source):
+    return alt.Chart(source).mark_area(opacity=0.2).encode(
+        x='Risk Score:Q',
+        y='Lower:Q',
+        y2='Upper:Q',
+        color='Outcome:N'
+    )
+
+# Histogram of the reference cohort (Start, End and Cohort % fields, see
+# percentile_index.py), drawn in grey on its own right-hand axis
+def cohort_distribution(source):
+    return alt.Chart(source).mark_bar(color='gray', opacity=0.25).encode(
+        x=alt.X('Start:Q', title='Risk Score'),
+        x2='End:Q',
+        y=alt.Y('Cohort %:Q', axis=alt.Axis(orient='right', title='Patients in Cohort (%)')),
+        y2=alt.datum(0),
+        tooltip=['Start:Q', 'End:Q', 'Cohort %:Q']
+    )
+
+# A risk plot with the cohort histogram behind it, when there is one
+def with_cohort(chart, distribution):
+    if distribution is None:
+        return chart
+    return alt.layer(distribution, chart).resolve_scale(y='independent')
+
+# Marker data from a dict of equal-length lists, like the pd.DataFrame it replaces.
+# Encodings on it need explicit types ('Risk Score:Q').
+def marker_data(columns):
+    rows = zip(*columns.values())
+    return alt.Data(values=[{column: _plain(value) for column, value in zip(columns, row)} for row in rows])
+
+# NumPy scalars from the scorers as plain Python values for the JSON spec
+def _plain(value):
+    return value.item() if hasattr(value, 'item') else value
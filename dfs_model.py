@@ -0,0 +1,47 @@
+from spec_engine import load_model
+
+# The points table, probability tables and fitted curves live in
+# model_specs/dfs.json; this module exposes them under the names the
+# calculator page and the tools use
+model = load_model('dfs')
+
+# Offset-indexed lookup table keyed by year (3 or 5): the compiled model's
+# table under the page's keys, sharing its arrays and fitted curves
+prob_table = model.tables['risk_score'].view({3: 'any_event_3yr', 5: 'any_event_5yr'})
+
+# Closed-form probability (%) for any score, including scores outside the table:
+# the logistic curve fitted to the table (see parametric.py)
+def predict_probability(score, year):
+    return prob_table.fitted(score, year)
+
+# Columns expected by score_dataframe and score_batch, in calculate_risk_score argument order
+INPUT_COLUMNS = model.INPUT_COLUMNS
+OUTPUT_COLUMNS = model.OUTPUT_COLUMNS
+
+# Define the scoring function:
+# calculate_risk_score(who_grade, tstage, multifocality, nuclear_area, r_rpa, hepar, gpc)
+calculate_risk_score = model.scorer('risk_score')
+
+# Vectorized version of calculate_risk_score for whole cohorts
+calculate_risk_scores = model.batch_scorer('risk_score')
+
+def score_dataframe(df):
+    return calculate_risk_scores(*(df[column].to_numpy() for column in INPUT_COLUMNS))
+
+# Define the function to get the associated risk probabilities; scores outside
+# the table come from the fitted curves
+def get_risk_probabilities(score):
+    risk_3yr = prob_table.lookup(score, 3, 'fit')
+    risk_5yr = prob_table.lookup(score, 5, 'fit')
+    dfs_3yr = 100 - risk_3yr
+    dfs_5yr = 100 - risk_5yr
+    return risk_3yr, risk_5yr, dfs_3yr, dfs_5yr
+
+# Score one patient with the same functions the calculator page uses
+score_patient = model.score_patient
+
+# Score a DataFrame or a dict of arrays keyed by INPUT_COLUMNS
+score_batch = model.score_batch
+
+# The same as a structured array with one record per patient
+score_records = model.score_records
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+import bootstrap
+from spec_engine import load_model
+
+# The points and coefficients live in model_specs/eoe.json; this module exposes
+# them under the names the calculator page and the tools use
+model = load_model('eoe')
+
+# calculate_scores(age, duration, eos, fib, remodel) -> (score_str, score_dil, score_rng)
+calculate_scores = model.scorer('score_str', 'score_dil', 'score_rng')
+
+# Probability (0-1) of an output for one score or an array of scores, e.g.
+# predict_probability(score_str, 'p_str'), from the logistic curve in the spec
+def predict_probability(score, output):
+    return model.predict_probability(output, score)
+
+# (coef, intercept) of each output's logistic curve, keyed by its label, for the
+# risk plot
+def curve_coefficients():
+    return {
+        p.get('label', p['output']): (p['logistic']['coef'], p['logistic']['intercept'])
+        for p in model.probabilities if 'logistic' in p
+    }
+
+# Columns expected by score_batch, in calculate_scores argument order
+INPUT_COLUMNS = model.INPUT_COLUMNS
+OUTPUT_COLUMNS = model.OUTPUT_COLUMNS
+
+# Vectorized version of calculate_scores for whole cohorts
+calculate_scores_batch = model.batch_scorer('score_str', 'score_dil', 'score_rng')
+
+# Score one patient with the same functions the calculator page uses
+score_patient = model.score_patient
+
+# Score a DataFrame or a dict of arrays keyed by INPUT_COLUMNS
+score_batch = model.score_batch
+
+# The same as a structured array with one record per patient
+score_records = model.score_records
+
+# Outputs whose spec supplies coefficient covariance or bootstrap replicates
+INTERVAL_OUTPUTS = [p['output'] for p in model.probabilities if bootstrap.has_uncertainty(p)]
+
+# Confidence interval (lower, upper) of an output's probability, e.g.
+# predict_interval(score_str, 'p_str'), for one score or an array of scores
+def predict_interval(score, output, level=bootstrap.LEVEL):
+    return bootstrap.predict_interval(model, output, score, level)
+
+# Interval bands over bootstrap.SCORE_GRID for the risk plot, one row per
+# outcome label and score
+def interval_data(step=10, level=bootstrap.LEVEL):
+    data = {'Risk Score': [], 'Outcome': [], 'Lower': [], 'Upper': []}
+    scores = bootstrap.SCORE_GRID[::step]
+    for output in INTERVAL_OUTPUTS:
+        lower, upper = bootstrap.interval_table(model, output, level)
+        data['Risk Score'].extend(scores.tolist())
+        data['Outcome'].extend([model.probability(output).get('label', output)] * len(scores))
+        data['Lower'].extend(np.round(lower[::step], 5).tolist())
+        data['Upper'].extend(np.round(upper[::step], 5).tolist())
+    return pd.DataFrame(data)
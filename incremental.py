@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import bulk_score
+import scoring
+from spec_engine import model_hash
+
+# Incremental re-scoring against a persisted result store. The store is a
+# directory with one Parquet file per model, <store>/<model>.parquet, holding
+# each patient's outputs together with a hash of the inputs they were computed
+# from and a hash of the model spec. A run only scores the rows whose inputs
+# changed or that were scored with a different version of the model, takes every
+# other row from the store, and writes the full scored file as bulk_score.py would.
+#
+#   python bulk_score.py os cohort.parquet scored.parquet --store results/
+#
+# Editing a model's spec (its points or probability tables) changes its hash, so
+# the next run re-scores that model's rows and leaves the other models' alone.
+# The store is rewritten on every run and only replaces the previous one once the
+# run has finished. Stored patients missing from the run's input (a partial file,
+# such as one day's admissions) are carried over unchanged, unless the run prunes
+# them (--prune, for a full extract of a registry that patients can leave).
+
+DEFAULT_ID_COLUMN = 'patient_id'
+KEY_COLUMNS = ['patient_id', 'input_hash', 'model_hash']
+
+# One 64-bit hash per row of the model's input columns. Numbers are hashed as
+# float64 and everything else as text, so 40 and 40.0 (a CSV column that picks
+# up a blank in one extract) hash the same.
+def input_hashes(model, chunk):
+    columns = {}
+    for column in model.INPUT_COLUMNS:
+        values = chunk[column]
+        if values.dtype.kind in 'biuf':
+            columns[column] = values.astype(np.float64)
+        else:
+            columns[column] = values.astype(str)
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+    return hashes.view(np.int64)
+
+# The stored results of one model, and the writer for the store that replaces them
+class ResultStore:
+    def __init__(self, directory, model, prune=False):
+        self.model = model
+        self.prune = prune
+        self.version = model_hash(model)
+        self.path = os.path.join(directory, f'{model.name}.parquet')
+        self.temporary = f'{self.path}.{os.getpid()}.tmp'
+        self.writer = None
+        os.makedirs(directory, exist_ok=True)
+
+        _, pq = bulk_score.import_parquet()
+        stored = None
+        if os.path.exists(self.path):
+            stored = pq.read_table(self.path).to_pandas()
+            # A store written for other outputs (an edited spec) is scored afresh
+            if list(stored.columns) != KEY_COLUMNS + model.OUTPUT_COLUMNS:
+                stored = None
+        if stored is None:
+            stored = pd.DataFrame({column: [] for column in KEY_COLUMNS + model.OUTPUT_COLUMNS})
+        stored = stored.drop_duplicates('patient_id', keep='last')
+        self.ids = pd.Index(stored['patient_id'].astype(str))
+        self.input_hash = stored['input_hash'].to_numpy(np.int64)
+        self.model_hash = stored['model_hash'].astype(str).to_numpy(object)
+        self.outputs = {column: stored[column].to_numpy() for column in model.OUTPUT_COLUMNS}
+        # Stored rows whose patient appeared in this run
+        self.seen = np.zeros(len(self.ids), dtype=bool)
+
+    # Row of each ID in the store (-1 for new patients) and whether that row is
+    # current for the given input hashes
+    def lookup(self, ids, hashes):
+        position = self.ids.get_indexer(ids)
+        self.seen[position[position >= 0]] = True
+        fresh = np.zeros(len(ids), dtype=bool)
+        if len(self.ids):
+            fresh = (position >= 0) & (self.input_hash[position] == hashes) & (self.model_hash[position] == self.version)
+        return position, fresh
+
+    # Add one scored chunk to the new store
+    def write(self, ids, hashes, outputs):
+        pa, pq = bulk_score.import_parquet()
+        versions = pa.DictionaryArray.from_arrays(np.zeros(len(ids), dtype=np.int32), [self.version])
+        table = self._table(ids, hashes, versions, outputs)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.temporary, table.schema)
+        self.writer.write_table(table)
+
+    def _table(self, ids, hashes, versions, outputs):
+        pa, _ = bulk_score.import_parquet()
+        return pa.table({
+            'patient_id': pa.array(ids, pa.string()),
+            'input_hash': pa.array(hashes, pa.int64()),
+            'model_hash': versions,
+            **{column: pa.array(outputs[column]) for column in self.model.OUTPUT_COLUMNS},
+        })
+
+    # Replace the previous store with the one written by this run, keeping the
+    # stored patients the run did not see unless it prunes them
+    def commit(self):
+        if self.writer is None:
+            return
+        unseen = np.flatnonzero(~self.seen)
+        if not self.prune and len(unseen):
+            pa, _ = bulk_score.import_parquet()
+            versions = pa.array(self.model_hash[unseen], pa.string()).dictionary_encode()
+            outputs = {column: values[unseen] for column, values in self.outputs.items()}
+            table = self._table(self.ids[unseen].to_numpy(), self.input_hash[unseen], versions, outputs)
+            self.writer.write_table(table.cast(self.writer.schema))
+        self.writer.close()
+        self.writer = None
+        os.replace(self.temporary, self.path)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            os.remove(self.temporary)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+# Score one chunk against the store: returns the scored chunk and a mask of the
+# rows that were taken from the store instead of being scored
+def score_chunk(store, chunk, id_column=DEFAULT_ID_COLUMN):
+    model = store.model
+    if id_column not in chunk:
+        raise ValueError(f"Incremental scoring needs a {id_column!r} column to key the result store.")
+    ids = chunk[id_column].astype(str).to_numpy()
+    hashes = input_hashes(model, chunk)
+    position, fresh = store.lookup(ids, hashes)
+    stale = np.flatnonzero(~fresh)
+
+    # Scored with no rows when nothing changed, which still gives the output
+    # dtypes the chunk would be scored with
+    rescored = model.score_batch(chunk.iloc[stale])
+    outputs = {}
+    for column in model.OUTPUT_COLUMNS:
+        values = np.asarray(rescored[column])
+        merged = np.empty(len(chunk), dtype=values.dtype)
+        merged[fresh] = store.outputs[column][position[fresh]]
+        merged[stale] = values
+        outputs[column] = merged
+    store.write(ids, hashes, outputs)
+    return chunk.assign(**outputs), fresh
+
+# Score input_path into output_path, re-scoring only changed rows. Returns the
+# number of rows written and the number skipped because the store was current.
+# With changed_only, only the re-scored rows are written, e.g. for a nightly delta.
+# With prune, stored patients missing from the input are dropped from the store.
+def run(name, input_path, output_path, store_directory, id_column=DEFAULT_ID_COLUMN,
+        chunksize=bulk_score.DEFAULT_CHUNKSIZE, changed_only=False, prune=False):
+    model = scoring.get_model(name)
+    skipped = 0
+    with ResultStore(store_directory, model, prune) as store:
+        def chunks():
+            nonlocal skipped
+            last, written = None, False
+            for chunk in bulk_score.iter_chunks(input_path, chunksize):
+                scored, fresh = score_chunk(store, chunk, id_column)
+                skipped += int(fresh.sum())
+                last = scored = scored[~fresh] if changed_only else scored
+                # Empty chunks are held back: an empty chunk's text columns have
+                # no type, which would fix the wrong Parquet schema
+                if len(scored):
+                    written = True
+                    yield scored
+            if not written and last is not None:
+                yield last
+        rows = bulk_score.write_chunks(output_path, chunks())
+        store.commit()
+    return rows, skipped
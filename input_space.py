@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from spec_engine import load_model
+
+# Every input of the HCC calculators is discrete once nuclear area is reduced to
+# its four scoring bands and r-RPA to whole percentages, as on the sliders. This
+# module scores every input combination once and stores the risk scores in an
+# int16 grid, so serving a patient is a single array index plus the lookup of
+# the score in the model's probability table (shared, not copied per cell).
+# Grids can be saved as .npy files (loaded memory-mapped) and exported as JSON
+# for client-side lookup:
+#
+#   python input_space.py build input_space/
+
+# Grid axes per model, in INPUT_COLUMNS order: (column, kind, values).
+#   'category': the input must equal one of the values
+#   'band':     values are band edges; the grid holds one cell per band
+#   'whole':    whole numbers from 0 to values; inputs must be whole numbers
+#   'truncate': like 'whole', but inputs are truncated with int() first, as the
+#               scoring function does
+GRIDS = {
+    'recmet': [
+        ('who_grade', 'category', [1, 2, 3]),
+        ('t_stage', 'category', [1, 2, 3, 4]),
+        ('hepar', 'category', ['high', 'low']),
+        ('gpc', 'category', ['+', '-']),
+        ('nuclear_area', 'band', [15, 20, 25]),
+        ('r_rpa', 'whole', 100),
+    ],
+    'dfs': [
+        ('who_grade', 'category', [1, 2, 3]),
+        ('tstage', 'category', [1, 2, 3, 4]),
+        ('multifocality', 'category', [False, True]),
+        ('nuclear_area', 'band', [15, 20, 25]),
+        ('r_rpa', 'truncate', 100),
+        ('hepar', 'category', ['high', 'low']),
+        ('gpc', 'category', ['negative', 'positive']),
+    ],
+    'os': [
+        ('who_grade', 'category', [1, 2, 3]),
+        ('tstage', 'category', [1, 2, 3, 4]),
+        ('cirrhosis', 'category', [False, True]),
+        ('portal_hyp', 'category', [False, True]),
+        ('hepar', 'category', ['high', 'low']),
+        ('gpc', 'category', ['negative', 'positive']),
+        ('r_rpa', 'truncate', 100),
+    ],
+}
+
+# One representative input value per grid cell along an axis
+def axis_points(kind, values):
+    if kind == 'category':
+        return list(values)
+    if kind == 'band':
+        return [0] + list(values)
+    return list(range(values + 1))
+
+class InputSpaceTable:
+    def __init__(self, name, cells):
+        self.name = name
+        self.axes = GRIDS[name]
+        self.shape = tuple(len(axis_points(kind, values)) for _, kind, values in self.axes)
+        if cells.shape != self.shape:
+            raise ValueError(f"Expected a {self.shape} grid for {name!r}, got {cells.shape}.")
+        if cells.dtype != np.int16:
+            raise ValueError(f"Expected a grid of int16 risk scores for {name!r}, got {cells.dtype}; rebuild it.")
+        self.cells = cells
+        model = load_model(name)
+        # The risk score and the two probabilities looked up from it
+        self.fields = model.OUTPUT_COLUMNS[:3]
+        self.table = model.tables[self.fields[0]]
+
+    @classmethod
+    def build(cls, name):
+        model = load_model(name)
+        points = [axis_points(kind, values) for _, kind, values in GRIDS[name]]
+        index = np.meshgrid(*(np.arange(len(p)) for p in points), indexing='ij')
+        columns = {column: np.asarray(p)[i].ravel() for (column, _, _), p, i in zip(GRIDS[name], points, index)}
+        scores = np.asarray(model.score_batch(columns)[model.OUTPUT_COLUMNS[0]])
+        if scores.min() < np.iinfo(np.int16).min or scores.max() > np.iinfo(np.int16).max:
+            raise ValueError(f"Risk scores of {name!r} do not fit in int16.")
+        return cls(name, scores.astype(np.int16).reshape(index[0].shape))
+
+    def save(self, path):
+        np.save(path, self.cells)
+
+    @classmethod
+    def load(cls, name, path):
+        return cls(name, np.load(path, mmap_mode='r'))
+
+    # Flat cell index for one patient or for arrays of patients, given as a dict
+    # (or DataFrame) keyed by INPUT_COLUMNS
+    def index(self, inputs):
+        positions = []
+        for column, kind, values in self.axes:
+            value = np.asarray(inputs[column])
+            if kind == 'category':
+                position = np.full(value.shape, -1)
+                for i, category in enumerate(values):
+                    position[value == category] = i
+                if (position < 0).any():
+                    raise ValueError(f"{column} must be one of {values}.")
+            elif kind == 'band':
+                if np.isnan(value).any():
+                    raise ValueError(f"{column} must be a number.")
+                position = np.searchsorted(values, value, side='right')
+            else:
+                if kind == 'truncate':
+                    value = np.trunc(value)
+                elif not np.all(np.mod(value, 1) == 0):
+                    raise ValueError(f"{column} must be a whole number.")
+                position = value.astype(np.int64)
+                if ((position < 0) | (position > values)).any():
+                    raise ValueError(f"{column} must be between 0 and {values}.")
+            positions.append(position)
+        return np.ravel_multi_index(positions, self.shape)
+
+    def lookup(self, inputs):
+        scores = self.cells.reshape(-1)[self.index(inputs)]
+        score_field, *probability_fields = self.fields
+        if scores.ndim == 0:
+            score = scores.item()
+            return {score_field: score, **{field: self.table.lookup(score, field, 'nan') for field in probability_fields}}
+        return {score_field: scores, **{field: self.table.lookup(scores, field, 'nan') for field in probability_fields}}
+
+    # Plain JSON for client-side lookup: the axes, the grid shape (row-major), the
+    # flat list of risk scores and the probability table indexed by
+    # score - min_score
+    def to_json(self):
+        score_field, *probability_fields = self.fields
+        return {
+            'model': self.name,
+            'axes': [{'name': column, 'kind': kind, 'values': values} for column, kind, values in self.axes],
+            'shape': list(self.shape),
+            'fields': {score_field: self.cells.reshape(-1).tolist()},
+            'table': {
+                'min_score': self.table.min_score,
+                **{field: self.table.values(field).tolist() for field in probability_fields},
+            },
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute every input combination of the HCC calculators.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="write <model>.npy and <model>.json for every HCC model")
+    build.add_argument('directory')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.directory, exist_ok=True)
+    for name in GRIDS:
+        table = InputSpaceTable.build(name)
+        table.save(os.path.join(args.directory, f'{name}.npy'))
+        with open(os.path.join(args.directory, f'{name}.json'), 'w') as f:
+            json.dump(table.to_json(), f, separators=(',', ':'))
+        print(f"{name}: {table.cells.size:,} combinations, {table.cells.nbytes:,} bytes")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import cProfile
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+# Timing spans and per-rerun profiling for the calculator pages, switched on with
+# environment variables and close to free when they are not set:
+#
+#   CALCULATOR_METRICS=json         one JSON log line per rerun with the time spent
+#                                   in each span (to stderr, or appended to
+#                                   CALCULATOR_METRICS_FILE)
+#   CALCULATOR_METRICS=prometheus   span histograms in the Prometheus text format,
+#                                   rewritten after every rerun to
+#                                   CALCULATOR_METRICS_FILE (default
+#                                   calculator_metrics.prom), e.g. for the
+#                                   node_exporter textfile collector
+#   CALCULATOR_METRICS=json,prometheus  both, with the JSON lines on stderr
+#   CALCULATOR_PROFILE=cprofile     dump a cProfile .prof file per rerun, or
+#   CALCULATOR_PROFILE=pyinstrument a pyinstrument .html report per rerun, into
+#                                   CALCULATOR_PROFILE_DIR (default profiles/)
+#
+# A page calls start_rerun(page) at the top and finish_rerun() at the bottom, and
+# wraps each stage in `with span('scoring'):`. Reruns that Streamlit interrupts
+# before finish_rerun are discarded.
+
+METRICS = {value.strip() for value in os.environ.get('CALCULATOR_METRICS', '').lower().split(',') if value.strip()}
+METRICS_FILE = os.environ.get('CALCULATOR_METRICS_FILE')
+PROFILE = os.environ.get('CALCULATOR_PROFILE', '').lower()
+PROFILE_DIR = os.environ.get('CALCULATOR_PROFILE_DIR', 'profiles')
+METRICS_FORMATS = ('json', 'prometheus')
+PROFILERS = ('cprofile', 'pyinstrument')
+
+if METRICS - set(METRICS_FORMATS):
+    raise ValueError(f"CALCULATOR_METRICS must be a comma-separated subset of {METRICS_FORMATS}.")
+if PROFILE and PROFILE not in PROFILERS:
+    raise ValueError(f"CALCULATOR_PROFILE must be one of {PROFILERS}.")
+if PROFILE == 'pyinstrument':
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        raise ImportError("CALCULATOR_PROFILE=pyinstrument requires pyinstrument (pip install pyinstrument).") from None
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Spans of the rerun running on this thread; Streamlit runs each session's
+# script on its own thread
+_local = threading.local()
+_lock = threading.Lock()
+# (page, span) -> [count per bucket..., count, sum]
+_histograms = {}
+_profile_numbers = itertools.count(1)
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('spans', 'name', 'start')
+
+    def __init__(self, spans, name):
+        self.spans = spans
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.spans[self.name] = self.spans.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+if METRICS:
+    def span(name):
+        spans = getattr(_local, 'spans', None)
+        return _NULL_SPAN if spans is None else _Span(spans, name)
+else:
+    def span(name):
+        return _NULL_SPAN
+
+def start_rerun(page):
+    if not (METRICS or PROFILE):
+        return
+    _stop_profiler()
+    _local.page = page
+    _local.spans = {} if METRICS else None
+    _local.start = time.perf_counter()
+    if PROFILE == 'cprofile':
+        _local.profiler = cProfile.Profile()
+        _local.profiler.enable()
+    elif PROFILE == 'pyinstrument':
+        _local.profiler = Profiler()
+        _local.profiler.start()
+
+def finish_rerun():
+    if getattr(_local, 'page', None) is None:
+        return
+    elapsed = time.perf_counter() - _local.start
+    page, spans = _local.page, _local.spans
+    _local.page = _local.spans = None
+
+    profiler = _stop_profiler()
+    if profiler is not None:
+        _dump_profile(page, profiler)
+    if spans is not None:
+        spans['rerun'] = elapsed
+        _record(page, spans)
+
+def _stop_profiler():
+    profiler = getattr(_local, 'profiler', None)
+    _local.profiler = None
+    if profiler is not None:
+        if PROFILE == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+    return profiler
+
+def _dump_profile(page, profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{page}-{time.strftime('%Y%m%d-%H%M%S')}-{next(_profile_numbers):06d}")
+    if PROFILE == 'cprofile':
+        profiler.dump_stats(stem + '.prof')
+    else:
+        with open(stem + '.html', 'w') as f:
+            f.write(profiler.output_html())
+
+def _record(page, spans):
+    with _lock:
+        for name, seconds in spans.items():
+            histogram = _histograms.setdefault((page, name), [0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+        if 'prometheus' in METRICS:
+            _write_atomic(METRICS_FILE or 'calculator_metrics.prom', prometheus_text())
+        if 'json' in METRICS:
+            line = json.dumps({
+                'event': 'rerun',
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'page': page,
+                'spans_ms': {name: round(seconds * 1e3, 4) for name, seconds in spans.items()},
+            })
+            if METRICS_FILE and 'prometheus' not in METRICS:
+                with open(METRICS_FILE, 'a') as f:
+                    f.write(line + '\n')
+            else:
+                print(line, file=sys.stderr, flush=True)
+
+def _write_atomic(path, text):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+# Every span histogram recorded by this process in the Prometheus text format
+def prometheus_text():
+    lines = [
+        '# HELP calculator_span_seconds Time spent in each stage of a calculator rerun.',
+        '# TYPE calculator_span_seconds histogram',
+    ]
+    for (page, name), histogram in sorted(_histograms.items()):
+        labels = f'page="{page}",span="{name}"'
+        for bound, count in zip(BUCKETS, histogram):
+            lines.append(f'calculator_span_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'calculator_span_seconds_bucket{{{labels},le="+Inf"}} {histogram[-2]}')
+        lines.append(f'calculator_span_seconds_count{{{labels}}} {histogram[-2]}')
+        lines.append(f'calculator_span_seconds_sum{{{labels}}} {histogram[-1]:.9f}')
+    return '\n'.join(lines) + '\n'
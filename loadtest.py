@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+# Load generator for sizing a deployment. It simulates many users at once and
+# reports throughput and latency percentiles:
+#
+#   python loadtest.py streamlit --sessions 50 --duration 30
+#       N concurrent browser sessions against a Streamlit server (streamlit_app.py,
+#       started on a free port unless --url is given), spread over the rec-met,
+#       DFS, OS and EoE pages. Each session opens its page and then keeps moving a
+#       random slider or selectbox; latency is the time from sending the change to
+#       the end of the rerun, as a user would wait for it.
+#
+#   python loadtest.py api --url http://localhost:8000 --clients 50 --duration 30
+#       N concurrent keep-alive clients posting random patients to /score/<model>
+#       of server.py or async_server.py.
+#
+# --think adds a pause between a session's interactions (default 0: every session
+# interacts back to back, the worst case of a tumor board all moving sliders).
+
+PAGES = ['recmet', 'dfs', 'os', 'eoe']
+PERCENTILES = (50, 95, 99)
+
+# Count, throughput and latency percentiles in milliseconds for one target
+def summarize(latencies, errors, elapsed):
+    latencies = np.asarray(latencies) * 1e3
+    summary = {'requests': len(latencies), 'errors': errors, 'throughput': len(latencies) / elapsed}
+    for percentile in PERCENTILES:
+        summary[f'p{percentile}_ms'] = float(np.percentile(latencies, percentile)) if len(latencies) else None
+    summary['max_ms'] = float(latencies.max()) if len(latencies) else None
+    return summary
+
+async def run_streamlit(url, sessions, duration, think, seed):
+    from streamlit_client import Session
+
+    latencies = {page: [] for page in PAGES}
+    errors = {page: 0 for page in PAGES}
+    deadline = time.perf_counter() + duration
+
+    async def user(number):
+        page = PAGES[number % len(PAGES)]
+        rng = random.Random(seed + number)
+        session = await Session(url, page).connect()
+        try:
+            await session.rerun()
+            while time.perf_counter() < deadline:
+                session.change_randomly(rng)
+                start = time.perf_counter()
+                try:
+                    messages = await session.rerun()
+                except Exception:
+                    errors[page] += 1
+                    return
+                latencies[page].append(time.perf_counter() - start)
+                if any(message.WhichOneof('type') == 'session_event' and message.session_event.HasField('script_compilation_exception')
+                       for message in messages):
+                    errors[page] += 1
+                if think:
+                    await asyncio.sleep(rng.expovariate(1 / think))
+        finally:
+            await session.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(number) for number in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return {page: summarize(latencies[page], errors[page], elapsed) for page in PAGES if latencies[page] or errors[page]}
+
+# Random patients for each model, from the benchmark cohorts
+def patient_bodies(model, count, seed):
+    import scoring
+    from benchmark import make_cohort
+
+    cohort = make_cohort(model, count, seed)
+    columns = scoring.get_model(model).INPUT_COLUMNS
+    rows = zip(*(np.asarray(cohort[column]).tolist() for column in columns))
+    return [json.dumps(dict(zip(columns, row))).encode() for row in rows]
+
+async def run_api(url, clients, duration, think, seed, models):
+    host, _, port = url.split('://', 1)[-1].rstrip('/').partition(':')
+    port = int(port or 80)
+    bodies = {model: patient_bodies(model, 1000, seed) for model in models}
+    latencies = {model: [] for model in models}
+    errors = {model: 0 for model in models}
+    deadline = time.perf_counter() + duration
+
+    async def client(number):
+        model = models[number % len(models)]
+        rng = random.Random(seed + number)
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                body = rng.choice(bodies[model])
+                request = (f"POST /score/{model} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                           f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+                start = time.perf_counter()
+                writer.write(request)
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+                latencies[model].append(time.perf_counter() - start)
+                if status != 200:
+                    errors[model] += 1
+                if think:
+                    await asyncio.sleep(rng.expovariate(1 / think))
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError, ValueError):
+            errors[model] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {model: summarize(latencies[model], errors[model], elapsed) for model in models}
+
+def print_report(results, file=sys.stdout):
+    print(f"{'target':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}", file=file)
+    for target, summary in results.items():
+        cells = [f"{summary[key]:>9.1f}" if summary[key] is not None else f"{'-':>9}" for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')]
+        print(f"{target:<10} {summary['requests']:>9,} {summary['errors']:>7,} {summary['throughput']:>9.1f} {' '.join(cells)}", file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent users of the calculators and report latency percentiles.")
+    subparsers = parser.add_subparsers(dest='target', required=True)
+    pages = subparsers.add_parser('streamlit', help="browser sessions moving widgets on the Streamlit pages")
+    pages.add_argument('--url', help="running Streamlit server (default: start streamlit_app.py)")
+    pages.add_argument('--sessions', type=int, default=20)
+    api = subparsers.add_parser('api', help="clients posting patients to the JSON API")
+    api.add_argument('--url', default='http://localhost:8000')
+    api.add_argument('--clients', type=int, default=20)
+    api.add_argument('--models', default=','.join(PAGES), help="comma-separated models (default: %(default)s)")
+    for subparser in (pages, api):
+        subparser.add_argument('--duration', type=float, default=30, help="seconds (default: %(default)s)")
+        subparser.add_argument('--think', type=float, default=0, help="mean seconds between a user's interactions (default: %(default)s)")
+        subparser.add_argument('--seed', type=int, default=0)
+        subparser.add_argument('--output', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.target == 'streamlit':
+        if args.url:
+            results = asyncio.run(run_streamlit(args.url, args.sessions, args.duration, args.think, args.seed))
+        else:
+            from streamlit_client import Server
+            with Server() as server:
+                results = asyncio.run(run_streamlit(server.url, args.sessions, args.duration, args.think, args.seed))
+        users = args.sessions
+    else:
+        models = args.models.split(',')
+        results = asyncio.run(run_api(args.url, args.clients, args.duration, args.think, args.seed, models))
+        users = args.clients
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'target': args.target, 'users': users, 'duration': args.duration, 'think': args.think, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
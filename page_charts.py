@@ -0,0 +1,113 @@
+import altair as alt
+import pandas as pd
+
+from charts import cohort_distribution, curve_source, interval_bands, logistic_curves, marker_data, table_curves, with_cohort
+from percentile_index import load_index
+
+# The risk plots of the calculator pages. The pages cache the base charts (the
+# curves and the reference cohort's histogram) with st.cache_resource and build
+# the patient's layers on every rerun; benchmark.py times these same functions.
+# Each builder imports its own model, so a page only compiles its model's spec.
+
+# Histogram of a model's reference cohort, or None when no index has been built.
+# It is sent inline rather than written to the public static files.
+def cohort_layer(name):
+    index = load_index(name)
+    return cohort_distribution(index.distribution()) if index is not None else None
+
+def recmet_base_chart():
+    import recmet_model
+    prob_data = pd.DataFrame(recmet_model.model.table_data('risk_score'))
+    curves = table_curves(
+        curve_source('recmet_curves', prob_data),
+        list(prob_data.columns[1:]),
+        '3-Year and 5-Year Recurrence/Metastasis Risk Probability'
+    )
+    return curves, cohort_layer('recmet')
+
+# Both DFS charts share one table; the DFS curves are computed from it in the browser
+def dfs_base_charts():
+    import dfs_model
+    prob_data = pd.DataFrame(dfs_model.model.table_data('risk_score'))
+    source = curve_source('dfs_curves', prob_data)
+    columns = [column for column in prob_data.columns if 'Any Event' in column]
+    # Plot for Any Event Risk
+    base_risk = table_curves(source, columns, '3-Year and 5-Year Any Event Risk Probability')
+    # Plot for Disease-Free Survival (DFS)
+    base_dfs = table_curves(source, columns, '3-Year and 5-Year Disease-Free Survival Probability', complement='DFS Probability')
+    return base_risk, base_dfs, cohort_layer('dfs')
+
+# Both OS charts share one table; the survival curves are computed from it in the browser
+def os_base_charts():
+    import os_model
+    prob_data = pd.DataFrame(os_model.model.table_data('risk_score'))
+    source = curve_source('os_curves', prob_data)
+    columns = [column for column in prob_data.columns if 'Death' in column]
+    # Plot for Death Risk
+    base_risk = table_curves(source, columns, '3-Year and 5-Year Death Risk Probability')
+    # Plot for Overall Survival
+    base_survival = table_curves(source, columns, '3-Year and 5-Year Overall Survival Probability', complement='Survival Probability')
+    return base_risk, base_survival, cohort_layer('os')
+
+# The EoE curves are evaluated in the browser from the coefficients, so no curve
+# data is sent; 95% confidence bands are added when the model spec supplies the
+# coefficient uncertainty
+def eoe_base_chart():
+    import eoe_model
+    curves = logistic_curves(eoe_model.curve_coefficients(), 0, 601)
+    if eoe_model.INTERVAL_OUTPUTS:
+        curves = interval_bands(curve_source('eoe_intervals', eoe_model.interval_data())) + curves
+    return curves, cohort_layer('eoe')
+
+# A yellow and a red marker for a patient's 3- and 5-year values of field, with
+# the two Year labels
+def year_markers(risk_score, field, values, years):
+    return [
+        alt.Chart(marker_data({
+            'Risk Score': [risk_score],
+            field: [value],
+            'Year': [year]
+        })).mark_point(size=100, color=color).encode(
+            x='Risk Score:Q',
+            y=f'{field}:Q',
+            tooltip=['Risk Score:Q', f'{field}:Q']
+        )
+        for value, year, color in zip(values, years, ['yellow', 'red'])
+    ]
+
+# An HCC curve chart with the patient's markers, and the cohort histogram behind
+# it when one is given
+def hcc_chart(base, risk_score, field, values, years, distribution=None):
+    dot_3yr, dot_5yr = year_markers(risk_score, field, values, years)
+    return with_cohort(base + dot_3yr + dot_5yr, distribution)
+
+# The EoE chart with a marker per outcome and, for the outputs in intervals, the
+# patient's confidence interval. scores, probabilities and intervals are keyed
+# by output (p_str, p_dil, p_rng).
+def eoe_chart(base, scores, probabilities, intervals, distribution=None):
+    import eoe_model
+    labels = {p['output']: p.get('label', p['output']) for p in eoe_model.model.probabilities}
+    dots = alt.Chart(marker_data({
+        "Risk Score": list(scores.values()),
+        "Probability": [probabilities[output] for output in scores],
+        "Outcome": [labels[output] for output in scores]
+    })).mark_point(size=100).encode(
+        x="Risk Score:Q",
+        y="Probability:Q",
+        color="Outcome:N",
+        tooltip=["Outcome:N", "Risk Score:Q", "Probability:Q"]
+    )
+    chart = base + dots
+    if intervals:
+        chart += alt.Chart(marker_data({
+            "Risk Score": [scores[output] for output in intervals],
+            "Lower": [lower for lower, upper in intervals.values()],
+            "Upper": [upper for lower, upper in intervals.values()],
+            "Outcome": [labels[output] for output in intervals]
+        })).mark_rule(strokeWidth=2).encode(
+            x="Risk Score:Q",
+            y="Lower:Q",
+            y2="Upper:Q",
+            color="Outcome:N"
+        )
+    return with_cohort(chart, distribution)
@@ -0,0 +1,92 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+import bulk_score
+import scoring
+from probability_table import ProbabilityTable
+
+# Multi-core version of bulk_score.run. The parent process reads the input in
+# partitions and keeps at most two per worker in flight; workers score them and
+# render CSV themselves, and the parent writes results back in input order.
+# The model's probability tables are placed in shared memory once and mapped by
+# every worker instead of being pickled to each of them.
+
+# Shared memory blocks attached by this worker; kept referenced so they stay mapped
+_attached = []
+
+# Copy a ProbabilityTable into one shared memory block, one row per column.
+# Returns the block, which the caller must close and unlink, and the metadata
+# workers need to rebuild the table from it.
+def share_table(table):
+    keys = list(table.columns)
+    dtype = np.result_type(*table.columns.values())
+    shape = (len(keys), len(table))
+    shm = SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    for row, key in zip(view, keys):
+        row[:] = table.columns[key]
+    return shm, (shm.name, table.min_score, keys, dtype.str, shape, table.fits)
+
+def attach_table(shm_name, min_score, keys, dtype, shape, fits=None):
+    shm = SharedMemory(name=shm_name)
+    _attached.append(shm)
+    view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    view.flags.writeable = False
+    return ProbabilityTable(np.arange(min_score, min_score + shape[1]), dict(zip(keys, view)), fits)
+
+def _init_worker(name, shared_tables):
+    model = scoring.get_model(name)
+    for score, shared_table in shared_tables.items():
+        model.tables[score] = attach_table(*shared_table)
+
+def _score_partition(name, chunk, render_csv):
+    scored = bulk_score.score_chunk(name, chunk)
+    if render_csv:
+        return list(scored.columns), len(scored), scored.to_csv(header=False, index=False)
+    return scored
+
+# Yield fn(item) for every item in order, with at most `window` items in flight
+def _ordered_map(executor, fn, items, window):
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _write_csv(path, results):
+    rows = 0
+    with open(path, 'w', newline='') as f:
+        for index, (columns, count, text) in enumerate(results):
+            if index == 0:
+                f.write(pd.DataFrame(columns=columns).to_csv(index=False))
+            f.write(text)
+            rows += count
+    return rows
+
+def run_parallel(name, input_path, output_path, chunksize=bulk_score.DEFAULT_CHUNKSIZE, workers=None):
+    model = scoring.get_model(name)
+    workers = workers or os.cpu_count() or 1
+    render_csv = not bulk_score.is_parquet(output_path)
+
+    blocks, shared_tables = [], {}
+    try:
+        for score, table in model.tables.items():
+            shm, shared_tables[score] = share_table(table)
+            blocks.append(shm)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(name, shared_tables)) as executor:
+            partitions = ((name, chunk, render_csv) for chunk in bulk_score.iter_chunks(input_path, chunksize))
+            results = _ordered_map(executor, _score_partition, partitions, 2 * workers)
+            if render_csv:
+                return _write_csv(output_path, results)
+            return bulk_score.write_chunks(output_path, results)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,55 @@
+import numpy as np
+
+# The HCC probability tables are samples of logistic curves over the integer
+# risk score: probability (%) = 100 / (1 + exp(-(coef * score + intercept))).
+# fit_logistic recovers coef and intercept from a table, and running this module
+# reports how far each fitted curve is from the tabulated values:
+#
+#   python parametric.py
+
+def logistic_percent(score, coef, intercept):
+    log_odds = coef[0] * np.asarray(score, dtype=float) + intercept
+    return 100 / (1 + np.exp(-log_odds))
+
+# Least-squares fit on the percent scale. A weighted fit on the logit scale gives
+# the starting point, then Gauss-Newton refines it.
+def fit_logistic(scores, probabilities, iterations=20):
+    scores = np.asarray(scores, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    p = probabilities / 100
+    coef, intercept = np.polyfit(scores, np.log(p / (1 - p)), 1, w=p * (1 - p))
+
+    design = np.column_stack([scores, np.ones_like(scores)])
+    for _ in range(iterations):
+        fitted = logistic_percent(scores, [coef], intercept)
+        jacobian = design * (fitted * (1 - fitted / 100))[:, None]
+        step = np.linalg.lstsq(jacobian, probabilities - fitted, rcond=None)[0]
+        coef, intercept = coef + step[0], intercept + step[1]
+    return [float(coef)], float(intercept)
+
+# Max and root-mean-square difference, in percentage points, between a model's
+# fitted curve and its table
+def fit_error(model, year):
+    table = model.prob_table
+    scores = np.arange(table.min_score, table.max_score + 1)
+    error = model.predict_probability(scores, year) - table.values(year)
+    return float(np.abs(error).max()), float(np.sqrt(np.mean(error ** 2)))
+
+def main():
+    import dfs_model
+    import os_model
+    import recmet_model
+
+    for model in (recmet_model, dfs_model, os_model):
+        table = model.prob_table
+        scores = np.arange(table.min_score, table.max_score + 1)
+        table_bytes = table.scores.nbytes + sum(values.nbytes for values in table.columns.values())
+        print(f"{model.__name__} (scores {table.min_score}..{table.max_score}, table {table_bytes:,} bytes)")
+        for year in (3, 5):
+            coef, intercept = fit_logistic(scores, table.values(year))
+            max_error, rms_error = fit_error(model, year)
+            print(f"  {year}-year: refit coef={coef[0]:.8f} intercept={intercept:.8f}; "
+                  f"shipped curve max error {max_error:.4f} pp, RMS {rms_error:.4f} pp")
+
+if __name__ == '__main__':
+    main()
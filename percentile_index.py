@@ -0,0 +1,164 @@
+import argparse
+import functools
+import json
+import logging
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from spec_engine import load_model, model_hash
+
+# Where a patient's risk score falls in a reference cohort. The cohort is scored
+# once, offline, and only its sorted scores are kept: <dir>/<model>.npy, loaded
+# memory-mapped, next to <dir>/<model>.json with the patient count and the hash
+# of the model spec the scores were computed with.
+#
+#   python percentile_index.py build os cohort.parquet percentile_index/
+#
+# A percentile is two binary searches of the sorted scores, and the histogram the
+# pages overlay on their risk plots is one binary search per bin edge, so neither
+# reads more than a few pages of the file, however large the cohort.
+#
+# Cohorts with the model's input columns are scored with the current spec; a file
+# that only has the score column (scores from another system) is used as is. The
+# calculator pages look for indexes in CALCULATOR_PERCENTILE_INDEX (default
+# percentile_index/ next to this file) and show nothing extra for models without
+# a current one. Only the model being ranked is loaded; the scoring tools are
+# imported by build, which the pages never call.
+#
+# Patients with a missing or non-finite input are left out of the cohort: the
+# scorers would reject them (r-RPA) or score the gap as a value (a missing
+# category scores like an unlisted one).
+
+INDEX_DIR = os.environ.get(
+    'CALCULATOR_PERCENTILE_INDEX',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'percentile_index'),
+)
+# The score ranked for each model; for EoE that is the stricture score
+SCORE_COLUMNS = {'recmet': 'risk_score', 'dfs': 'risk_score', 'os': 'risk_score', 'eoe': 'score_str'}
+# Most bars the cohort histogram is drawn with
+MAX_BINS = 60
+
+logger = logging.getLogger(__name__)
+
+class PercentileIndex:
+    def __init__(self, name, scores, version=None):
+        self.name = name
+        self.score = SCORE_COLUMNS[name]
+        if scores.ndim != 1 or not len(scores):
+            raise ValueError(f"A percentile index for {name!r} needs a non-empty 1-D array of scores.")
+        model = load_model(name)
+        if version is not None and version != model_hash(model):
+            raise ValueError(f"The percentile index for {name!r} was built with another version of the model; rebuild it.")
+        self.scores = scores
+
+    @classmethod
+    def build(cls, name, cohort_path, chunksize=None):
+        import bulk_score
+        model = load_model(name)
+        score = SCORE_COLUMNS[name]
+        parts = []
+        excluded = 0
+        for chunk in bulk_score.iter_chunks(cohort_path, chunksize or bulk_score.DEFAULT_CHUNKSIZE):
+            if all(column in chunk for column in model.INPUT_COLUMNS):
+                complete = complete_rows(chunk[model.INPUT_COLUMNS])
+                excluded += int(np.count_nonzero(~complete))
+                values = model.score_batch(chunk[complete])[score]
+            elif score in chunk:
+                values = chunk[score]
+            else:
+                raise ValueError(f"The cohort needs the {name!r} input columns or a {score!r} column.")
+            values = np.asarray(values, dtype=np.float64)
+            parts.append(values[~np.isnan(values)])
+        if excluded:
+            logger.warning("Left %d patients with missing inputs out of the %r cohort.", excluded, name)
+        scores = np.sort(np.concatenate(parts)) if parts else np.empty(0)
+        return cls(name, scores)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, f'{self.name}.npy'), np.asarray(self.scores))
+        with open(os.path.join(directory, f'{self.name}.json'), 'w') as f:
+            json.dump({
+                'model': self.name,
+                'score': self.score,
+                'patients': len(self.scores),
+                'model_hash': model_hash(load_model(self.name)),
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, name, directory):
+        with open(os.path.join(directory, f'{name}.json')) as f:
+            metadata = json.load(f)
+        scores = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        return cls(name, scores, metadata['model_hash'])
+
+    def __len__(self):
+        return len(self.scores)
+
+    # Percentile rank (0-100) of one score or an array of scores: the share of the
+    # cohort scoring lower, counting patients with the same score as half below
+    def percentile(self, score):
+        below = np.searchsorted(self.scores, score, side='left')
+        at_or_below = np.searchsorted(self.scores, score, side='right')
+        ranks = (below + at_or_below) / (2 * len(self.scores)) * 100
+        return float(ranks) if np.ndim(ranks) == 0 else ranks
+
+    # Histogram of the cohort for the risk plots: one row per bin of whole-number
+    # width, with its Start and End score and the percentage of patients in it
+    def distribution(self, max_bins=MAX_BINS):
+        low, high = float(self.scores[0]), float(self.scores[-1])
+        step = max(1, math.ceil((high - low) / max_bins))
+        start = math.floor(low / step) * step
+        edges = np.arange(start, high + step + 1, step)
+        counts = np.diff(np.searchsorted(self.scores, edges, side='left'))
+        keep = slice(0, int(np.flatnonzero(counts).max()) + 1)
+        return pd.DataFrame({
+            'Start': edges[:-1][keep],
+            'End': edges[1:][keep],
+            'Cohort %': np.round(counts[keep] / len(self.scores) * 100, 3),
+        })
+
+# Rows of a DataFrame of inputs with no missing (None, NaN) or infinite value
+def complete_rows(inputs):
+    return ~inputs.isna().any(axis=1).to_numpy() & np.isfinite(inputs.select_dtypes('number').to_numpy(float)).all(axis=1)
+
+# The index of a model in INDEX_DIR, or None when none has been built. Loaded once
+# per process and shared by every session. The index is optional for the pages,
+# so one that is stale (built with another version of the spec) or unreadable is
+# logged and skipped rather than raised; PercentileIndex.load raises instead.
+@functools.lru_cache(maxsize=None)
+def load_index(name, directory=INDEX_DIR):
+    if not os.path.exists(os.path.join(directory, f'{name}.npy')):
+        return None
+    try:
+        return PercentileIndex.load(name, directory)
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        logger.warning("Ignoring the percentile index for %r in %s: %s", name, directory, error)
+        return None
+
+# "63rd" for 63.4
+def ordinal(percentile):
+    number = int(round(percentile))
+    if number % 100 in (11, 12, 13):
+        return f'{number}th'
+    return f"{number}{({1: 'st', 2: 'nd', 3: 'rd'}).get(number % 10, 'th')}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the reference-cohort percentile index of a calculator.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="score a cohort file and write <model>.npy and <model>.json")
+    build.add_argument('model', choices=sorted(SCORE_COLUMNS))
+    build.add_argument('cohort', help="CSV or Parquet file")
+    build.add_argument('directory', nargs='?', default=INDEX_DIR)
+    build.add_argument('--chunksize', type=int, help="rows per chunk (default: bulk_score.py's)")
+    args = parser.parse_args(argv)
+
+    index = PercentileIndex.build(args.model, args.cohort, args.chunksize)
+    index.save(args.directory)
+    print(f"{args.model}: {len(index):,} patients, {index.score} {index.scores[0]:g} to {index.scores[-1]:g}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import numpy as np
+
+from parametric import logistic_percent
+
+OUT_OF_RANGE_POLICIES = ('clip', 'nan', 'raise', 'fit')
+# Most decimal places a column can have and still be stored as float32
+MAX_DECIMALS = 6
+
+# Score-to-probability table stored as NumPy arrays indexed by score - min_score,
+# so a lookup is a subtraction and an index instead of a DataFrame scan.
+#
+# The tables are stored compactly: int16 scores and float32 probabilities. The
+# tabulated probabilities are decimals (13.555), which float32 cannot hold
+# exactly, so each column keeps its number of decimal places and lookups round
+# the float32 value back to it; this gives exactly the float64 a table value
+# was given as. A column that does not survive the round trip is kept as float64.
+class ProbabilityTable:
+    def __init__(self, scores, columns, fits=None):
+        scores = np.asarray(scores)
+        self.min_score = int(scores[0])
+        self.max_score = int(scores[-1])
+        if not np.array_equal(scores, np.arange(self.min_score, self.max_score + 1)):
+            raise ValueError("Risk scores must be consecutive integers in ascending order.")
+        dtype = np.int16 if np.iinfo(np.int16).min <= self.min_score and self.max_score <= np.iinfo(np.int16).max else np.int64
+        self.scores = _read_only(np.arange(self.min_score, self.max_score + 1, dtype=dtype))
+        # Columns are read-only, as one table is shared by every session and
+        # thread of a process: read-only arrays in their stored form (another
+        # table's columns, shared memory) are kept as they are and anything else
+        # is copied once
+        self.columns = {}
+        self.decimals = {}
+        for key, values in columns.items():
+            values = np.asarray(values)
+            if len(values) != len(scores):
+                raise ValueError(f"Column {key!r} has {len(values)} values for {len(scores)} risk scores.")
+            values, self.decimals[key] = _compact(values)
+            self.columns[key] = values
+        # Logistic curves fitted to columns (see parametric.py), as (coef, intercept)
+        # on the percent scale, for scores outside the table
+        self.fits = dict(fits or {})
+        unknown = set(self.fits) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Fits for unknown columns {sorted(unknown, key=str)}.")
+        # The curves are only evaluated up to a table's length beyond either end;
+        # scores further out come from inputs no model was built for
+        self.fit_range = (self.min_score - len(self), self.max_score + len(self))
+
+    # The same table with its columns (and their fits) under other keys, e.g.
+    # view({3: 'death_3yr', 5: 'death_5yr'}). The arrays are shared, not copied.
+    def view(self, keys):
+        return ProbabilityTable(
+            np.arange(self.min_score, self.max_score + 1),
+            {key: self.columns[column] for key, column in keys.items()},
+            fits={key: self.fits[column] for key, column in keys.items() if column in self.fits},
+        )
+
+    # A column's probabilities as float64, exactly as the table was given
+    def values(self, key):
+        return _decode_array(self.columns[key], self.decimals[key])
+
+    def __len__(self):
+        return self.max_score - self.min_score + 1
+
+    def __contains__(self, score):
+        return self.min_score <= score <= self.max_score and score == int(score)
+
+    # The column's fitted curve at one score or an array of scores, inside the
+    # table or not
+    def fitted(self, score, key):
+        coef, intercept = self.fits[key]
+        return logistic_percent(score, [coef], intercept)
+
+    # Whether lookup(score, key, 'fit') gives a probability for one score
+    def can_fit(self, score, key):
+        return score in self or (key in self.fits and self.fit_range[0] <= score <= self.fit_range[1])
+
+    # Look up one score or an array of scores in the given column.
+    # out_of_range decides what happens to scores outside min_score..max_score:
+    # 'clip' uses the nearest end of the table, 'nan' returns NaN, 'raise' raises
+    # ValueError and 'fit' evaluates the column's fitted curve within fit_range
+    # (NaN beyond it and for columns without one). Non-finite scores are NaN under
+    # 'nan' and 'fit' and raise otherwise. Scores inside the table always come
+    # from the table.
+    def lookup(self, score, key, out_of_range='raise'):
+        if out_of_range not in OUT_OF_RANGE_POLICIES:
+            raise ValueError(f"out_of_range must be one of {OUT_OF_RANGE_POLICIES}, got {out_of_range!r}.")
+        values = self.columns[key]
+
+        decimals = self.decimals[key]
+
+        if np.ndim(score) == 0:
+            if score in self:
+                return _decode(values[int(score) - self.min_score], decimals)
+            if not np.isfinite(score) and out_of_range in ('nan', 'fit'):
+                return float('nan')
+            self._check_whole(score)
+            if out_of_range == 'clip':
+                return _decode(values[0] if score < self.min_score else values[-1], decimals)
+            if out_of_range == 'fit' and self.can_fit(score, key):
+                return float(self.fitted(score, key))
+            if out_of_range in ('nan', 'fit'):
+                return float('nan')
+            raise ValueError(f"Risk score {score} is outside {self.min_score}..{self.max_score}.")
+
+        index = np.asarray(score)
+        if index.dtype.kind != 'i':
+            if out_of_range in ('nan', 'fit'):
+                # Non-finite scores are moved beyond every range
+                index = np.where(np.isfinite(index), index, self.fit_range[1] + 1)
+            self._check_whole(index)
+            index = index.astype(np.int64)
+        index = index - self.min_score
+
+        if out_of_range == 'clip':
+            return _decode_array(np.take(values, index, mode='clip'), decimals)
+        inside = (index >= 0) & (index < len(values))
+        if inside.all():
+            return _decode_array(np.take(values, index), decimals)
+        if out_of_range == 'raise':
+            raise ValueError(f"{np.count_nonzero(~inside)} risk scores are outside {self.min_score}..{self.max_score}.")
+        result = np.full(index.shape, np.nan)
+        result[inside] = _decode_array(np.take(values, index[inside]), decimals)
+        if out_of_range == 'fit' and key in self.fits:
+            fit = ~inside & (index >= self.fit_range[0] - self.min_score) & (index <= self.fit_range[1] - self.min_score)
+            result[fit] = self.fitted(index[fit] + self.min_score, key)
+        return result
+
+    @staticmethod
+    def _check_whole(score):
+        if not np.all(np.mod(score, 1) == 0):
+            raise ValueError("Risk scores must be whole numbers.")
+
+def _read_only(values):
+    values.flags.writeable = False
+    return values
+
+# The stored form of a column and its number of decimal places: float32 when
+# rounding the float32 values to the fewest decimal places that represent the
+# column gives back every value exactly (in lookups of one score and of arrays),
+# float64 and None otherwise
+def _compact(values):
+    wide = values.astype(np.float64)
+    for decimals in range(MAX_DECIMALS + 1):
+        exact = np.round(wide, decimals)
+        if values.dtype == np.float32:
+            found = np.array_equal(exact.astype(np.float32), values)
+        else:
+            found = np.array_equal(exact, wide)
+        if found:
+            break
+    else:
+        return _stored(values, np.float64), None
+    narrow = exact.astype(np.float32)
+    if (np.array_equal(_decode_array(narrow, decimals), exact)
+            and [_decode(value, decimals) for value in narrow] == exact.tolist()):
+        return _stored(values, np.float32), decimals
+    return _stored(exact, np.float64), None
+
+def _stored(values, dtype):
+    if values.dtype == dtype and values.flags.c_contiguous and not values.flags.writeable:
+        return values
+    return _read_only(np.array(values, dtype=dtype))
+
+def _decode(value, decimals):
+    return float(value) if decimals is None else round(float(value), decimals)
+
+def _decode_array(values, decimals):
+    values = values.astype(np.float64)
+    return values if decimals is None else np.round(values, decimals, out=values)
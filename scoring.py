@@ -0,0 +1,57 @@
+import functools
+
+import numpy as np
+
+from spec_engine import load_models
+
+# Compiled models by the name used in the HTTP service and the command-line
+# tools: one per spec in model_specs/, so a new spec is served without code changes
+MODELS = load_models()
+
+def get_model(name):
+    try:
+        return MODELS[name]
+    except KeyError:
+        raise KeyError(f"Unknown model {name!r}, expected one of {sorted(MODELS)}.") from None
+
+# Score one patient given as a dict keyed by the model's INPUT_COLUMNS
+def score_patient(name, patient):
+    model = get_model(name)
+    return model.score_patient(*(patient[column] for column in model.INPUT_COLUMNS))
+
+# Score a list of patient dicts in one vectorized pass and return one result dict per patient.
+# Probabilities for scores outside the model's table come from its fitted curve,
+# or are returned as None for a table without one.
+def score_records(name, patients):
+    model = get_model(name)
+    columns = {column: [patient[column] for patient in patients] for column in model.INPUT_COLUMNS}
+    records = model.score_records(columns)
+    return [dict(zip(model.OUTPUT_COLUMNS, row)) for row in _to_rows(records)]
+
+# Records as tuples of plain Python values, with None for NaN
+def _to_rows(records):
+    rows = records.tolist()
+    for index, field in enumerate(records.dtype.names):
+        if records.dtype[field].kind == 'f' and np.isnan(records[field]).any():
+            rows = [row[:index] + (None,) + row[index + 1:] if row[index] != row[index] else row for row in rows]
+    return rows
+
+# The probability curves a calculator plots, for clients that draw their own
+# charts: the table of each tabulated score ('Risk Score' plus one column per
+# output label) and the coefficients of each logistic output. Built once per
+# process; callers must not modify the result.
+@functools.lru_cache(maxsize=None)
+def curve_data(name):
+    model = get_model(name)
+    return {
+        'tables': {score: model.table_data(score) for score in model.tables},
+        'logistic': {
+            p['output']: {
+                'score': p['score'],
+                'label': p.get('label', p['output']),
+                'coef': p['logistic']['coef'],
+                'intercept': p['logistic']['intercept'],
+            }
+            for p in model.probabilities if 'logistic' in p
+        },
+    }
@@ -0,0 +1,169 @@
+import argparse
+import json
+import math
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scoring
+
+# Headless JSON API for the calculators. It calls the same scoring modules as the
+# Streamlit pages, so results match what the UI shows.
+#
+#   GET  /health          -> {"status": "ok"}
+#   GET  /models          -> input and output columns of every model
+#   GET  /curves/<model>  -> the probability curves the calculator plots
+#   POST /score/<model>   -> score one patient object
+#   POST /batch/<model>   -> score {"patients": [...]} in one vectorized pass
+#
+# <model> is one of recmet, dfs, os or eoe.
+
+# Route one request to the scoring modules and return (status, payload). Pure and
+# thread-safe, so the threaded server below and the asyncio server in
+# async_server.py share it.
+def handle(method, path, body=b''):
+    if method == 'GET':
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/models':
+            return 200, {
+                name: {'inputs': model.INPUT_COLUMNS, 'outputs': model.OUTPUT_COLUMNS}
+                for name, model in scoring.MODELS.items()
+            }
+        _, route, name = (path.split('/') + ['', ''])[:3]
+        if route == 'curves' and name in scoring.MODELS:
+            return 200, scoring.curve_data(name)
+        return 404, {'error': f"No route for GET {path}."}
+
+    _, route, name = (path.split('/') + ['', ''])[:3]
+    if method != 'POST' or name not in scoring.MODELS or route not in ('score', 'batch'):
+        return 404, {'error': f"No route for {method} {path}."}
+    try:
+        body = json.loads(body or b'null', parse_float=_finite_float, parse_constant=_reject_constant)
+    except ValueError as error:
+        return 400, {'error': f"Invalid JSON body: {error}"}
+
+    try:
+        if route == 'score':
+            return 200, scoring.score_patient(name, body)
+        return 200, {'results': scoring.score_records(name, body['patients'])}
+    except KeyError as error:
+        return 400, {'error': f"Missing field {error}."}
+    except (TypeError, ValueError) as error:
+        return 400, {'error': str(error)}
+
+# json.loads accepts NaN, Infinity and numbers too large for a float (1e999),
+# none of which is valid JSON or scorable; they would come back as a literal NaN
+def _finite_float(text):
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"Number {text} is out of range.")
+    return value
+
+def _reject_constant(name):
+    raise ValueError(f"{name} is not a valid JSON number.")
+
+# Largest request body either server reads
+MAX_BODY = 64 * 1024 * 1024
+# Seconds spent draining a rejected request before its connection is closed
+LINGER = 2.0
+
+# Length of the request body from its Content-Length and Transfer-Encoding
+# headers, as (length, None), or (None, (status, payload)) with the error
+# response for a malformed, negative or oversized length or a transfer coding,
+# after which the connection must be closed. Chunked bodies are not read: their
+# chunks would otherwise be parsed as the next request.
+def content_length(header, transfer_encoding=None):
+    if transfer_encoding:
+        if transfer_encoding.split(',')[-1].strip().lower() == 'chunked':
+            return None, (411, {'error': "Chunked request bodies are not supported; send a Content-Length."})
+        return None, (501, {'error': f"Transfer-Encoding {transfer_encoding!r} is not supported."})
+    try:
+        length = int(header or 0)
+    except ValueError:
+        return None, (400, {'error': f"Invalid Content-Length {header!r}."})
+    if length < 0:
+        return None, (400, {'error': f"Invalid Content-Length {header!r}."})
+    if length > MAX_BODY:
+        return None, (413, {'error': f"Request bodies are limited to {MAX_BODY} bytes."})
+    return length, None
+
+def encode_json(payload):
+    return json.dumps(payload, default=_json_default).encode()
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests; Nagle is disabled so
+    # small responses are not held back waiting for an ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    quiet = True
+
+    def do_GET(self):
+        self.send_json(*handle('GET', self.path))
+
+    def do_POST(self):
+        length, error = content_length(self.headers.get('Content-Length'), self.headers.get('Transfer-Encoding'))
+        if error:
+            self.reject(*error)
+            return
+        self.send_json(*handle('POST', self.path, self.rfile.read(length)))
+
+    # Answer a request whose body cannot be read and close the connection. The
+    # rest of the request is read and dropped first (for at most LINGER seconds):
+    # closing with unread data in the socket resets the connection and discards
+    # the response.
+    def reject(self, status, payload):
+        self.close_connection = True
+        self.send_json(status, payload)
+        try:
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_WR)
+            self.connection.settimeout(LINGER)
+            while self.rfile.read1(64 * 1024):
+                pass
+        except OSError:
+            pass
+
+    def send_json(self, status, payload):
+        body = encode_json(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Errors from http.server itself (malformed request lines, overlong headers)
+    # as JSON too, like every other response
+    def send_error(self, code, message=None, explain=None):
+        self.close_connection = True
+        self.send_json(code, {'error': message or self.responses.get(code, ('Error',))[0]})
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+# NumPy scalars from the scoring modules are not JSON serializable on their own
+def _json_default(value):
+    if hasattr(value, 'item'):
+        value = value.item()
+        return None if isinstance(value, float) and math.isnan(value) else value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the HCC and EoE calculators as a JSON API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--verbose', action='store_true', help="log every request to stderr")
+    args = parser.parse_args(argv)
+
+    ScoringHandler.quiet = not args.verbose
+    server = ThreadingHTTPServer((args.host, args.port), ScoringHandler)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+import hashlib
+import json
+import keyword
+import linecache
+import os
+
+import numpy as np
+
+from probability_table import ProbabilityTable
+
+# Points-based models are described declaratively in model_specs/<name>.json and
+# compiled once at load time into a scalar scorer, a vectorized scorer and the
+# score-to-probability mapping. Adding or changing a model is a JSON edit.
+#
+# A spec has:
+#   "name", "inputs"     model name and input columns, in argument order; inputs
+#                        must be Python identifiers not starting with "_"
+#   "scores"             {score name: {"dtype": "int" (optional), "terms": [...]}}
+#   "probabilities"      [{"output": ..., "score": ..., <mapping>}, ...]
+#   "out_of_range"       value returned by the scalar scorer for scores missing
+#                        from a table without a "fit" (the batch scorer returns NaN)
+#
+# Terms are added in order:
+#   {"type": "map", "input": x, "points": [[value, points], ...], "default": 0}
+#   {"type": "rules", "rules": [{"when": {x: value, ...}, "points": p}, ...], "default": 0}
+#       the first rule whose inputs all match wins
+#   {"type": "bands", "input": x, "edges": [e1, ...], "points": [p0, p1, ...], "nan_points": 0}
+#       p0 below e1, p1 from e1 up to e2, ..., and nan_points for NaN
+#   {"type": "slope", "input": x, "per": 10, "points": -2, "truncate": false, "round": ..., "max": null}
+#       "none":            min(x / per, max) * points
+#       "floor":           min(x // per, max) * points
+#       "half_even":       min(round(x / per), max) * points
+#       "half_even_after": round(points * (x / per))
+#       truncate applies int() to x first
+#
+# Probability mappings:
+#   "table": {"min_score": s, "values": [...]}, optional "label" and "fit" ({"coef", "intercept"})
+#       the fit is the logistic curve on the percent scale (see parametric.py)
+#       that serves scores outside the table
+#   "complement": {"of": output, "total": 100}        total - that output
+#   "logistic": {"coef": c, "intercept": b}           1 / (1 + exp(-(c * score + b)))
+#       optionally with the uncertainty of (coef, intercept) for confidence
+#       intervals (see bootstrap.py), either as bootstrap replicates in a file
+#       next to the spec, "replicates": "<file>.npy" or "<file>.csv", or as
+#       "covariance": [[var_coef, cov], [cov, var_intercept]] with an optional
+#       "draws" (default 2000) and "seed" for a parametric bootstrap
+
+SPEC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_specs')
+ROUNDING_MODES = ('none', 'floor', 'half_even', 'half_even_after')
+
+def logistic(score, coef, intercept):
+    log_odds = coef * score + intercept
+    return 1 / (1 + np.exp(-log_odds))
+
+# Batch slope terms of integer scores are cast to integers, where a missing value
+# would become an arbitrary number; the scalar scorers raise for it in round()
+def _finite(values, column):
+    missing = np.count_nonzero(~np.isfinite(values))
+    if missing:
+        raise ValueError(f"{column!r} has {missing} missing or non-finite values.")
+    return values
+
+# Scorers are compiled to Python source, one function per requested set of
+# scores, so a compiled model runs the same straight-line code a hand-written
+# calculator would. Sub-expressions shared between terms or scores (EoE's
+# scaled inputs, for example) are computed once per call.
+class _Source:
+    def __init__(self, inputs, batch):
+        self.inputs = inputs
+        self.batch = batch
+        # Set while compiling an integer score, so batch terms can stay integer arrays
+        self.integer = False
+        self.lines = []
+        self.names = {}
+        self.namespace = {'np': np, '_finite': _finite}
+
+    # Name for a value that has no literal form (dicts, arrays, non-finite floats)
+    def constant(self, value):
+        name = f'_c{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def literal(self, value):
+        if isinstance(value, (bool, int, str)) or (isinstance(value, float) and np.isfinite(value)):
+            return repr(value)
+        return self.constant(value)
+
+    # Local variable holding expr, computed once per call
+    def local(self, expr):
+        if expr not in self.names:
+            self.names[expr] = f'_v{len(self.names)}'
+            self.lines.append(f'{self.names[expr]} = {expr}')
+        return self.names[expr]
+
+    # np.select over (condition, points) pairs; np.where when there is only one.
+    # Neighbouring conditions with the same points are merged into one.
+    def select(self, matches, default):
+        merged = []
+        for condition, points in matches:
+            if merged and merged[-1][1] == points:
+                merged[-1] = (f'({merged[-1][0]}) | ({condition})', points)
+            else:
+                merged.append((condition, points))
+        matches = merged
+        if len(matches) == 1:
+            return self.local(f'np.where({matches[0][0]}, {matches[0][1]}, {default})')
+        conditions = ', '.join(condition for condition, _ in matches)
+        points = ', '.join(p for _, p in matches)
+        return self.local(f'np.select([{conditions}], [{points}], {default})')
+
+    def float_input(self, column):
+        return self.local(f'np.asarray({column}, dtype=float)') if self.batch else column
+
+    def function(self, name, result, filename):
+        arguments = ', '.join(self.inputs)
+        body = [f'{column} = np.asarray({column})' for column in self.inputs] if self.batch else []
+        body += self.lines + [f'return {result}']
+        source = f'def {name}({arguments}):\n' + ''.join(f'    {line}\n' for line in body)
+        # Registered under its filename so tracebacks through a scorer show its source
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        exec(compile(source, filename, 'exec'), self.namespace)
+        return self.namespace[name]
+
+def _compile_map(source, term):
+    x = term['input']
+    default = source.literal(term.get('default', 0))
+    if source.batch:
+        # Values scoring the default need no comparison
+        entries = [(value, p) for value, p in term['points'] if p != term.get('default', 0)]
+        if not entries:
+            return default
+        return source.select([(f'{x} == {source.literal(value)}', source.literal(p)) for value, p in entries], default)
+    points = source.constant({value: p for value, p in term['points']})
+    return source.local(f'{points}.get({x}, {default})')
+
+# Two rules can never both match when they require different values of one input
+def _exclusive(rule, other):
+    return any(column in other['when'] and other['when'][column] != value for column, value in rule['when'].items())
+
+def _compile_rules(source, term):
+    default = source.literal(term.get('default', 0))
+    rules = term['rules']
+    if source.batch:
+        # A rule scoring the default can be dropped when no later rule could
+        # match the same rows in its place
+        rules = [rule for i, rule in enumerate(rules)
+                 if rule['points'] != term.get('default', 0) or not all(_exclusive(rule, later) for later in rules[i + 1:])]
+        if not rules:
+            return default
+    matches = []
+    for rule in rules:
+        if source.batch:
+            # Each comparison is computed once and shared between rules
+            condition = ' & '.join(source.local(f'{column} == {source.literal(value)}') for column, value in rule['when'].items())
+        else:
+            condition = ' and '.join(f'({column} == {source.literal(value)})' for column, value in rule['when'].items())
+        matches.append((condition, source.literal(rule['points'])))
+    if source.batch:
+        return source.select(matches, default)
+    chain = ' else '.join(f'{p} if {condition}' for condition, p in matches)
+    return source.local(f'({chain} else {default})')
+
+def _compile_bands(source, term):
+    edges = [source.literal(edge) for edge in term['edges']]
+    points = [source.literal(p) for p in term['points']]
+    nan_points = source.literal(term.get('nan_points', 0))
+    if len(points) != len(edges) + 1:
+        raise ValueError(f"Bands on {term['input']!r} need one more points value than edges.")
+    if list(term['edges']) != sorted(term['edges']):
+        raise ValueError(f"Band edges on {term['input']!r} must be in ascending order.")
+    x = source.float_input(term['input'])
+    if source.batch:
+        # searchsorted places NaN after the last edge
+        band_points = source.constant(np.asarray(term['points']))
+        band_edges = source.constant(np.asarray(term['edges'], dtype=float))
+        expr = f"{band_points}[np.searchsorted({band_edges}, {x}, side='right')]"
+        if term.get('nan_points', 0) != term['points'][-1]:
+            expr = f'np.where(np.isnan({x}), {nan_points}, {expr})'
+        return source.local(expr)
+    # NaN fails every comparison and falls through to nan_points
+    conditions = [f'{x} < {edge}' for edge in edges] + [f'{x} >= {edges[-1]}']
+    chain = ' else '.join(f'{p} if {condition}' for condition, p in zip(conditions, points))
+    return source.local(f'({chain} else {nan_points})')
+
+def _compile_slope(source, term):
+    per = source.literal(term.get('per', 1))
+    points = source.literal(term['points'])
+    mode = term.get('round', 'none')
+    cap = term.get('max')
+    if mode not in ROUNDING_MODES:
+        raise ValueError(f"Unknown rounding {mode!r}, expected one of {ROUNDING_MODES}.")
+
+    x = term['input']
+    if source.batch and source.integer:
+        x = source.local(f'_finite({source.float_input(x)}, {source.literal(x)})')
+    elif source.batch and term.get('truncate', False):
+        x = source.float_input(x)
+    if term.get('truncate', False):
+        x = source.local(f'np.trunc({x})' if source.batch else f'int({x})')
+
+    # Rounded batch terms of integer scores are cast back to integers, as round() does
+    cast = '.astype(np.int64)' if source.batch and source.integer else ''
+    if mode == 'half_even_after':
+        expr = f'np.round({points} * ({x} / {per})){cast}' if source.batch else f'round({points} * ({x} / {per}))'
+        return source.local(expr)
+    if mode == 'floor':
+        quotient = f'np.floor_divide({x}, {per})' if source.batch else f'{x} // {per}'
+    elif mode == 'half_even':
+        quotient = f'np.round({x} / {per}){cast}' if source.batch else f'round({x} / {per})'
+    elif term.get('per', 1) == 1:
+        quotient = x
+    else:
+        quotient = f'{x} / {per}'
+    if cap is not None:
+        quotient = f'np.minimum({quotient}, {source.literal(cap)})' if source.batch else f'min({quotient}, {source.literal(cap)})'
+    return f'{source.local(quotient)} * {points}'
+
+_COMPILERS = {'map': _compile_map, 'rules': _compile_rules, 'bands': _compile_bands, 'slope': _compile_slope}
+
+def _compile_term(source, term):
+    kind = term.get('type')
+    if kind not in _COMPILERS:
+        raise ValueError(f"Unknown term type {kind!r}, expected one of {sorted(_COMPILERS)}.")
+    if kind == 'rules':
+        missing = {column for rule in term['rules'] for column in rule['when']} - set(source.inputs)
+        if missing:
+            raise ValueError(f"Rules refer to unknown inputs {sorted(missing)}.")
+    elif term.get('input') not in source.inputs:
+        raise ValueError(f"Term refers to unknown input {term.get('input')!r}.")
+    return _COMPILERS[kind](source, term)
+
+class CompiledModel:
+    def __init__(self, spec, spec_dir=SPEC_DIR):
+        self.spec = spec
+        # Files a spec refers to, such as bootstrap replicates, are relative to this
+        self.spec_dir = spec_dir
+        self.name = spec['name']
+        self.INPUT_COLUMNS = list(spec['inputs'])
+        for column in self.INPUT_COLUMNS:
+            if not column.isidentifier() or keyword.iskeyword(column) or column.startswith('_') or column == 'np':
+                raise ValueError(f"Input name {column!r} must be a Python identifier not starting with '_'.")
+
+        self.SCORE_COLUMNS = list(spec['scores'])
+        self._scorers = {}
+        self._score_all = self._compile(self.SCORE_COLUMNS, batch=False, as_tuple=True)
+        self._batch_score_all = self._compile(self.SCORE_COLUMNS, batch=True, as_tuple=True)
+
+        self.probabilities = list(spec.get('probabilities', []))
+        self.out_of_range = spec.get('out_of_range')
+        self.OUTPUT_COLUMNS = self.SCORE_COLUMNS + [p['output'] for p in self.probabilities]
+
+        # One ProbabilityTable per score, with a column per table output
+        self.tables = {}
+        table_columns = {}
+        table_fits = {}
+        for p in self.probabilities:
+            if 'score' in p and p['score'] not in self.SCORE_COLUMNS:
+                raise ValueError(f"Probability {p['output']!r} refers to unknown score {p['score']!r}.")
+            if 'table' in p:
+                min_score, columns = table_columns.setdefault(p['score'], (p['table']['min_score'], {}))
+                if p['table']['min_score'] != min_score:
+                    raise ValueError(f"Tables for {p['score']!r} must share the same min_score.")
+                columns[p['output']] = p['table']['values']
+                if 'fit' in p:
+                    table_fits.setdefault(p['score'], {})[p['output']] = (p['fit']['coef'], p['fit']['intercept'])
+        for score, (min_score, columns) in table_columns.items():
+            length = len(next(iter(columns.values())))
+            self.tables[score] = ProbabilityTable(np.arange(min_score, min_score + length), columns, table_fits.get(score))
+
+    def probability(self, output):
+        for p in self.probabilities:
+            if p['output'] == output:
+                return p
+        raise KeyError(output)
+
+    # One output's probability for one score or an array of scores, mapped the way
+    # score_batch maps it; out_of_range is the policy for tables
+    def predict_probability(self, output, score, out_of_range='fit'):
+        p = self.probability(output)
+        if 'table' in p:
+            return self.tables[p['score']].lookup(score, output, out_of_range)
+        if 'complement' in p:
+            return p['complement'].get('total', 100) - self.predict_probability(p['complement']['of'], score, out_of_range)
+        return logistic(score, p['logistic']['coef'], p['logistic']['intercept'])
+
+    # Scalar scorer taking the inputs in INPUT_COLUMNS order (or by name). It returns
+    # the score for one score name, or a tuple of scores for several.
+    def scorer(self, *scores):
+        return self._compile(scores, batch=False, as_tuple=len(scores) > 1)
+
+    # Vectorized scorer taking one array per input, returning arrays
+    def batch_scorer(self, *scores):
+        return self._compile(scores, batch=True, as_tuple=len(scores) > 1)
+
+    def _compile(self, scores, batch, as_tuple):
+        key = (tuple(scores), batch, as_tuple)
+        if key not in self._scorers:
+            source = _Source(self.INPUT_COLUMNS, batch)
+            results = []
+            for score in scores:
+                score_spec = self.spec['scores'][score]
+                source.integer = score_spec.get('dtype') == 'int'
+                total = ' + '.join(_compile_term(source, term) for term in score_spec['terms'])
+                if batch and score_spec.get('dtype') == 'int':
+                    total = f'({total}).astype(np.int64, copy=False)'
+                results.append(total)
+            # Scores with identical terms (EoE's stricture and dilation) are computed once
+            results = [source.local(total) if results.count(total) > 1 else total for total in results]
+            result = f"({', '.join(results)},)" if as_tuple else results[0]
+            filename = f"<{self.name}{' batch' if batch else ''}: {', '.join(scores)}>"
+            self._scorers[key] = source.function('score_batch' if batch else 'score', result, filename)
+        return self._scorers[key]
+
+    # Score one patient and map every score to its probabilities. Scores outside a
+    # table are mapped by its fitted curve, or to the spec's out_of_range value
+    # beyond the curve's range (see ProbabilityTable.lookup).
+    def score_patient(self, *args):
+        results = dict(zip(self.SCORE_COLUMNS, self._score_all(*args)))
+        for p in self.probabilities:
+            if 'table' in p:
+                table = self.tables[p['score']]
+                score = results[p['score']]
+                if table.can_fit(score, p['output']):
+                    results[p['output']] = table.lookup(score, p['output'], 'fit')
+                else:
+                    results[p['output']] = self.out_of_range
+            elif 'complement' in p:
+                base = results[p['complement']['of']]
+                results[p['output']] = p['complement'].get('total', 100) - base if isinstance(base, (int, float)) else base
+            else:
+                results[p['output']] = logistic(results[p['score']], p['logistic']['coef'], p['logistic']['intercept'])
+        return results
+
+    # Score a DataFrame or a dict of arrays keyed by INPUT_COLUMNS. out_of_range is
+    # the ProbabilityTable.lookup policy for scores outside a table.
+    def score_batch(self, columns, out_of_range='fit'):
+        scores = self._batch_score_all(*(columns[column] for column in self.INPUT_COLUMNS))
+        results = dict(zip(self.SCORE_COLUMNS, scores))
+        for p in self.probabilities:
+            if 'table' in p:
+                results[p['output']] = self.tables[p['score']].lookup(results[p['score']], p['output'], out_of_range)
+            elif 'complement' in p:
+                results[p['output']] = p['complement'].get('total', 100) - results[p['complement']['of']]
+            else:
+                results[p['output']] = logistic(results[p['score']], p['logistic']['coef'], p['logistic']['intercept'])
+        return results
+
+    # score_batch as records: a NumPy structured array with one record per patient
+    # and a field per OUTPUT_COLUMNS (40 bytes a patient for OS, against a few
+    # hundred for a dict of Python values)
+    def score_records(self, columns, out_of_range='fit'):
+        results = self.score_batch(columns, out_of_range)
+        arrays = [np.atleast_1d(results[column]) for column in self.OUTPUT_COLUMNS]
+        records = np.empty(len(arrays[0]), dtype=[(column, values.dtype) for column, values in zip(self.OUTPUT_COLUMNS, arrays)])
+        for column, values in zip(self.OUTPUT_COLUMNS, arrays):
+            records[column] = values
+        return records
+
+    # The table for one score in the layout of the original calculator pages:
+    # 'Risk Score' plus one column per table output, named by its label
+    def table_data(self, score):
+        table = self.tables[score]
+        data = {'Risk Score': list(range(table.min_score, table.max_score + 1))}
+        for p in self.probabilities:
+            if 'table' in p and p['score'] == score:
+                data[p.get('label', p['output'])] = list(p['table']['values'])
+        return data
+
+def compile_spec(spec, spec_dir=SPEC_DIR):
+    return CompiledModel(spec, spec_dir)
+
+_loaded = {}
+
+def load_model(name, spec_dir=SPEC_DIR):
+    path = os.path.join(spec_dir, f'{name}.json')
+    if path not in _loaded:
+        with open(path) as f:
+            _loaded[path] = compile_spec(json.load(f), spec_dir)
+    return _loaded[path]
+
+# Version of a model: a hash of its spec in canonical JSON form
+def model_hash(model):
+    text = json.dumps(model.spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+# Every spec in the directory, keyed by model name
+def load_models(spec_dir=SPEC_DIR):
+    names = sorted(filename[:-len('.json')] for filename in os.listdir(spec_dir) if filename.endswith('.json'))
+    return {name: load_model(name, spec_dir) for name in names}
@@ -0,0 +1,17 @@
+import streamlit as st
+
+# Single entry point serving all four calculators from one process. Streamlit
+# only executes a page script when that page is visited, so each calculator's
+# tables, charts and pandas/altair imports are loaded the first time it is opened.
+pages = {
+    "HCC": [
+        st.Page("app.py", title="Recurrence/Metastasis Risk", url_path="recmet", default=True),
+        st.Page("DFS.py", title="Any Event / Disease-Free Survival", url_path="dfs"),
+        st.Page("OS.py", title="Overall Survival", url_path="os"),
+    ],
+    "EoE": [
+        st.Page("EoE.py", title="EoE Fibrosis Risk", url_path="eoe"),
+    ],
+}
+
+st.navigation(pages).run()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+# A minimal client for a running Streamlit server, speaking the same websocket
+# protocol as the browser: each Session opens /_stcore/stream, asks for a page
+# to be run and reads the forward messages until the script finishes. It keeps
+# the sliders and selectboxes the page renders, so it can change them and rerun
+# like a user would. Used by benchmark.py --memory to measure what each browser
+# session costs the server, and by loadtest.py.
+
+# A streamlit_app.py server started in a subprocess on the given port
+class Server:
+    def __init__(self, port=8599, script='streamlit_app.py', options=()):
+        self.port = port
+        self.url = f'http://localhost:{port}'
+        directory = os.path.dirname(os.path.abspath(__file__))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', script, '--server.headless', 'true',
+             '--server.port', str(port), '--browser.gatherUsageStats', 'false', *options],
+            cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self._wait_until_healthy()
+
+    def _wait_until_healthy(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Streamlit exited with status {self.process.returncode}.")
+            try:
+                with urllib.request.urlopen(f'{self.url}/_stcore/health', timeout=1) as response:
+                    if response.status == 200:
+                        return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"Streamlit did not start on port {self.port} within {timeout}s.")
+
+    # Resident set size of the server process in bytes (Linux only)
+    def rss(self):
+        with open(f'/proc/{self.process.pid}/status') as f:
+            return int(re.search(r'VmRSS:\s+(\d+) kB', f.read()).group(1)) * 1024
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+class Session:
+    def __init__(self, url, page=''):
+        self.url = url.replace('http', 'ws', 1) + '/_stcore/stream'
+        self.page = page
+        self.websocket = None
+        # Widget id -> (kind, proto) for the sliders and selectboxes seen so far,
+        # and widget id -> value sent with every rerun, as the browser does
+        self.widgets = {}
+        self.values = {}
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.url, subprotocols=['streamlit'], max_size=None)
+        return self
+
+    # Run the page once and return the forward messages it produced
+    async def rerun(self):
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_name = self.page
+        for widget_id, value in self.values.items():
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            kind = self.widgets[widget_id][0]
+            if kind == 'slider':
+                state.double_array_value.data[:] = [value]
+            else:
+                state.string_value = value
+        await self.websocket.send(message.SerializeToString())
+        messages = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            messages.append(forward)
+            if forward.WhichOneof('type') == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                kind = element.WhichOneof('type')
+                if kind in ('slider', 'selectbox'):
+                    self.widgets[getattr(element, kind).id] = (kind, getattr(element, kind))
+            if forward.WhichOneof('type') == 'script_finished':
+                return messages
+
+    # Set a slider or selectbox (by its label) to a value; selectboxes take the
+    # option as displayed. The change is sent with the next rerun.
+    def set(self, label, value):
+        for widget_id, (kind, proto) in self.widgets.items():
+            if proto.label == label:
+                self.values[widget_id] = value
+                return
+        raise KeyError(f"No slider or selectbox labelled {label!r} on {self.page!r}.")
+
+    # Move one slider or selectbox to a random value, as a user exploring the page
+    # would; rng is a random.Random
+    def change_randomly(self, rng):
+        widget_id = rng.choice(sorted(self.widgets))
+        kind, proto = self.widgets[widget_id]
+        if kind == 'slider':
+            steps = int(round((proto.max - proto.min) / proto.step))
+            self.values[widget_id] = proto.min + proto.step * rng.randint(0, steps)
+        else:
+            self.values[widget_id] = rng.choice(list(proto.options))
+
+    async def close(self):
+        await self.websocket.close()
+
+# Server RSS per open session of a page: the RSS added by the first visit (the
+# page's imports and cached charts) and the average added by each of `sessions`
+# further sessions, all kept open until they are measured
+def session_memory(server, page, sessions=100, settle=1.0):
+    async def measure():
+        before = server.rss()
+        first = await Session(server.url, page).connect()
+        await first.rerun()
+        await asyncio.sleep(settle)
+        after_first = server.rss()
+        opened = []
+        for _ in range(sessions):
+            session = await Session(server.url, page).connect()
+            await session.rerun()
+            opened.append(session)
+        await asyncio.sleep(settle)
+        after = server.rss()
+        for session in [first] + opened:
+            await session.close()
+        return {'first_visit': after_first - before, 'per_session': (after - after_first) / sessions}
+    return asyncio.run(measure())
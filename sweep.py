@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from input_space import GRIDS, axis_points
+from spec_engine import load_model
+
+# What-if sweeps: hold a patient's inputs fixed, vary one or two of them over
+# their full range, and score every point in one vectorized pass. The pages show
+# the result as a line panel (one input) or a heatmap (two inputs) instead of
+# one rerun per slider position.
+
+# Values swept per input. HCC inputs use the input-space grid axes (categories,
+# one point per nuclear area band, r-RPA 0..100); EoE inputs step by the unit
+# each one is scored in, which reaches every score the slider range can produce.
+SWEEP_VALUES = {name: {column: axis_points(kind, values) for column, kind, values in grid} for name, grid in GRIDS.items()}
+SWEEP_VALUES['eoe'] = {
+    'age': list(range(0, 81, 10)),
+    'duration': list(range(0, 16)),
+    'eos': list(range(0, 101, 10)),
+    'fib': list(range(0, 301, 10)),
+    'remodel': list(range(0, 5001, 100)),
+}
+
+LABELS = {
+    'who_grade': 'WHO Grade',
+    't_stage': 'T Stage',
+    'tstage': 'T Stage',
+    'hepar': 'Hepar',
+    'gpc': 'GPC',
+    'multifocality': 'Multifocality',
+    'cirrhosis': 'Cirrhosis',
+    'portal_hyp': 'Portal Hypertension',
+    'nuclear_area': 'Nuclear Area % (band)',
+    'r_rpa': 'r-RPA %',
+    'age': 'Age (years)',
+    'duration': 'Disease duration (years)',
+    'eos': 'Eosinophils per HPF',
+    'fib': 'AI Fibrosis Score',
+    'remodel': 'Remodeling Score 3',
+}
+
+# Score the grid of `inputs` (one or two column names) around `patient`, a dict
+# keyed by the model's INPUT_COLUMNS. Returns one row per grid point with the
+# swept inputs and every output.
+def sweep(name, patient, inputs):
+    if name not in SWEEP_VALUES:
+        raise KeyError(f"Unknown model {name!r}, expected one of {sorted(SWEEP_VALUES)}.")
+    model = load_model(name)
+    if not 1 <= len(inputs) <= 2 or len(set(inputs)) != len(inputs):
+        raise ValueError("Sweep one input or two different inputs.")
+    for column in inputs:
+        if column not in SWEEP_VALUES[name]:
+            raise ValueError(f"{column!r} cannot be swept for {name!r}, expected one of {sorted(SWEEP_VALUES[name])}.")
+
+    axes = [np.asarray(SWEEP_VALUES[name][column]) for column in inputs]
+    grid = [axis.ravel() for axis in np.meshgrid(*axes, indexing='ij')]
+    size = grid[0].size
+    columns = {column: np.full(size, patient[column], dtype=object if isinstance(patient[column], str) else None)
+               for column in model.INPUT_COLUMNS}
+    columns.update(zip(inputs, grid))
+
+    results = model.score_batch(columns)
+    return pd.DataFrame({**{column: columns[column] for column in inputs}, **results})
+
+# Streamlit panel for a page: pick one or two inputs and an outcome, then draw the
+# sweep. Nothing is computed until the toggle is switched on.
+def sweep_panel(name, patient, outcomes):
+    import altair as alt
+    import streamlit as st
+
+    if not st.toggle("What-if sweep", key=f'{name}_sweep'):
+        return
+    choices = list(SWEEP_VALUES[name])
+    x = st.selectbox("Vary", choices, index=choices.index('r_rpa') if 'r_rpa' in choices else 0,
+                     format_func=LABELS.get, key=f'{name}_sweep_x')
+    y = st.selectbox("Against (optional)", [None] + [column for column in choices if column != x],
+                     format_func=lambda column: '—' if column is None else LABELS[column], key=f'{name}_sweep_y')
+
+    results = sweep(name, patient, [x] if y is None else [x, y])
+    # Long numeric ranges read best on a continuous axis; heatmap cells need discrete ones
+    continuous = y is None and len(SWEEP_VALUES[name][x]) > 5
+    x_field = alt.X(f"{x}:{'Q' if continuous else 'O'}", title=LABELS[x])
+
+    if y is None:
+        melted = results.melt(id_vars=[x], value_vars=list(outcomes), var_name='Outcome', value_name='Probability')
+        melted['Outcome'] = melted['Outcome'].map(outcomes)
+        chart = alt.Chart(melted).mark_line(point=not continuous).encode(
+            x=x_field,
+            y='Probability:Q',
+            color='Outcome:N',
+            tooltip=[f'{x}:O', 'Outcome:N', 'Probability:Q']
+        )
+    else:
+        outcome = st.selectbox("Outcome", list(outcomes), format_func=outcomes.get, key=f'{name}_sweep_outcome')
+        chart = alt.Chart(results).mark_rect().encode(
+            x=x_field,
+            y=alt.Y(f'{y}:O', title=LABELS[y], sort='descending'),
+            color=alt.Color(f'{outcome}:Q', title=outcomes[outcome]),
+            tooltip=[f'{x}:O', f'{y}:O', f'{outcome}:Q']
+        )
+    st.altair_chart(chart, use_container_width=True)
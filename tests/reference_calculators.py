@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+# The original calculators, as they were before the model specs: the scoring and
+# probability functions and tables of app.py, DFS.py, OS.py and EoE.py, copied
+# unchanged apart from the names. tests/test_spec_engine.py compares the compiled
+# models against them.
+
+# app.py
+recmet_data = {
+    'Risk Score': list(range(-20, 49)),
+    'Predicted 3-Year Probability of Recmet (%)': [
+        6.9, 7.6, 8.4, 9.4, 10.4, 11.4, 12.6, 13.9, 15.3, 16.9, 18.5, 20.3, 22.1, 24.1, 26.3,
+        28.5, 30.9, 33.3, 35.9, 38.5, 41.2, 44, 46.7, 49.6, 52.4, 55.2, 57.9, 60.7, 63.3, 65.9,
+        68.4, 70.8, 73, 75.2, 77.2, 79.2, 81, 82.6, 84.2, 85.6, 87, 88.2, 89.3, 90.3, 91.3,
+        92.1, 92.9, 93.6, 94.3, 94.8, 95.4, 95.8, 96.3, 96.7, 97, 97.3, 97.6, 97.8, 98.1, 98.3,
+        98.5, 98.6, 98.8, 98.9, 99, 99.1, 99.2, 99.3, 99.4
+    ],
+    'Predicted 5-Year Probability of Recmet (%)': [
+        14.7, 16.1, 17.5, 19.1, 20.7, 22.5, 24.3, 26.3, 28.3, 30.5, 32.7, 35, 37.4, 39.8, 42.3,
+        44.9, 47.5, 50, 52.6, 55.2, 57.7, 60.2, 62.7, 65, 67.4, 69.6, 71.7, 73.8, 75.7, 77.6,
+        79.3, 81, 82.5, 83.9, 85.3, 86.5, 87.7, 88.8, 89.8, 90.7, 91.5, 92.3, 93, 93.6, 94.2,
+        94.7, 95.2, 95.7, 96.1, 96.5, 96.8, 97.1, 97.4, 97.6, 97.9, 98.1, 98.3, 98.4, 98.6,
+        98.7, 98.8, 98.9, 99.1, 99.1, 99.2, 99.3, 99.4, 99.4, 99.5
+    ]
+}
+
+recmet_prob_data = pd.DataFrame(recmet_data)
+
+def recmet_calculate_risk_score(who_grade, t_stage, hepar, gpc, nuclear_area, r_rpa):
+    score = 0
+    # WHO Grade
+    if who_grade == 2:
+        score += 6
+    elif who_grade == 3:
+        score += 26
+    
+    # T Stage
+    if t_stage == 2:
+        score += 4
+    elif t_stage in [3, 4]:
+        score += 12
+    
+    # Hepar and GPC
+    if hepar == 'low' or gpc == '+':
+        score += 1
+    
+    # Nuclear Area Percentage
+    if nuclear_area < 15:
+        score += 0
+    elif 15 <= nuclear_area < 20:
+        score += 3
+    elif 20 <= nuclear_area < 25:
+        score += 6
+    elif nuclear_area >= 25:
+        score += 9
+    
+    # r-RPA
+    score += round(-2 * (r_rpa / 10))  # Subtract 2 points for each 10% increase
+
+    return score
+
+def recmet_get_risk_probability(score, prob_data, year):
+    column_name = f'Predicted {year}-Year Probability of Recmet (%)'
+    if score in prob_data['Risk Score'].values:
+        return prob_data[prob_data['Risk Score'] == score][column_name].values[0]
+    else:
+        return "Score out of range."
+
+# DFS.py
+dfs_data = {
+    'Risk Score': [-20, -19, -18, -17, -16, -15, -14, -13, -12, -11, -10, -9, -8, -7, -6, -5, -4, -3, -2, -1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45],
+    'Predicted 3-Year Probability of Any Event (%)': [1.68, 1.979, 2.329, 2.74, 3.22, 3.782, 4.437, 5.2, 6.085, 7.11, 8.292, 9.65, 11.203, 12.971, 14.97, 17.216, 19.722, 22.493, 25.529, 28.823, 32.357, 36.105, 40.03, 44.088, 48.225, 52.388, 56.517, 60.558, 64.46, 68.178, 71.678, 74.935, 77.933, 80.664, 83.131, 85.34, 87.304, 89.039, 90.562, 91.893, 93.051, 94.054, 94.92, 95.666, 96.306, 96.855, 97.325, 97.726, 98.068, 98.36, 98.608, 98.819, 98.999, 99.151, 99.28, 99.39, 99.483, 99.562, 99.629, 99.686, 99.734, 99.775, 99.809, 99.838, 99.863, 99.884],
+    'Predicted 5-Year Probability of Any Event (%)': [3.494, 4.095, 4.795, 5.607, 6.547, 7.632, 8.879, 10.308, 11.937, 13.783, 15.863, 18.192, 20.777, 23.624, 26.729, 30.082, 33.662, 37.44, 41.378, 45.429, 49.541, 53.66, 57.729, 61.696, 65.513, 69.14, 72.546, 75.707, 78.612, 81.256, 83.64, 85.775, 87.672, 89.347, 90.819, 92.105, 93.225, 94.196, 95.035, 95.758, 96.38, 96.914, 97.371, 97.762, 98.096, 98.381, 98.624, 98.831, 99.007, 99.156, 99.284, 99.392, 99.484, 99.562, 99.629, 99.685, 99.733, 99.773, 99.808, 99.837, 99.862, 99.883, 99.901, 99.916, 99.928, 99.939]
+}
+
+dfs_prob_data = pd.DataFrame(dfs_data)
+
+def dfs_calculate_risk_score(who_grade, tstage, multifocality, nuclear_area, r_rpa, hepar, gpc):
+    score = 0
+    # WHO Grade
+    score += {1: 0, 2: 4, 3: 24}.get(who_grade, 0)
+    # T Stage
+    score += {1: 0, 2: 2, 3: 9, 4: 10}.get(tstage, 0)
+    # Multifocality
+    score += {False: 0, True: 1}.get(multifocality, 0)
+    # Mean Nuclear Area Percentage
+    if nuclear_area < 15:
+        score += 0
+    elif 15 <= nuclear_area < 20:
+        score += 3
+    elif 20 <= nuclear_area < 25:
+        score += 6
+    else:  # above 25
+        score += 9
+    # R-RPA adjusted to the nearest integer
+    score += -2 * round(int(r_rpa) / 10)
+    # Hepar/GPC calculation
+    if hepar == "high" and gpc == "negative":
+        score += 0
+    elif (hepar == "high" and gpc == "positive") or (hepar == "low" and gpc == "negative"):
+        score += 1
+    elif hepar == "low" and gpc == "positive":
+        score += 1
+    
+    return score
+
+def dfs_get_risk_probabilities(score, prob_data):
+    if score in prob_data['Risk Score'].values:
+        risk_3yr = prob_data[prob_data['Risk Score'] == score]['Predicted 3-Year Probability of Any Event (%)'].values[0]
+        risk_5yr = prob_data[prob_data['Risk Score'] == score]['Predicted 5-Year Probability of Any Event (%)'].values[0]
+        dfs_3yr = 100 - risk_3yr
+        dfs_5yr = 100 - risk_5yr
+        return risk_3yr, risk_5yr, dfs_3yr, dfs_5yr
+    else:
+        return "Score out of range.", "Score out of range.", "Score out of range.", "Score out of range."
+
+# OS.py
+os_data = {
+    'Risk Score': [-30, -29, -28, -27, -26, -25, -24, -23, -22, -21, -20, -19, -18, -17, -16, -15, -14, -13, -12, -11, -10, -9, -8, -7, -6, -5, -4, -3, -2, -1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46, 47, 48, 49, 50, 51, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71, 72, 73, 74, 75, 76, 77],
+    'Predicted 3-Year Probability of Death (%)': [0.043, 0.051, 0.061, 0.072, 0.085, 0.101, 0.119, 0.141, 0.166, 0.197, 0.233, 0.275, 0.326, 0.385, 0.455, 0.539, 0.637, 0.752, 0.889, 1.05, 1.24, 1.464, 1.728, 2.039, 2.403, 2.831, 3.333, 3.92, 4.605, 5.404, 6.331, 7.406, 8.646, 10.071, 11.701, 13.555, 15.65, 18.002, 20.622, 23.512, 26.673, 30.09, 33.744, 37.603, 41.627, 45.765, 49.962, 54.16, 58.299, 62.325, 66.187, 69.845, 73.268, 76.433, 79.328, 81.952, 84.309, 86.409, 88.268, 89.901, 91.33, 92.573, 93.651, 94.581, 95.381, 96.069, 96.657, 97.16, 97.59, 97.955, 98.267, 98.531, 98.756, 98.946, 99.108, 99.245, 99.361, 99.46, 99.543, 99.614, 99.673, 99.724, 99.766, 99.803, 99.833, 99.859, 99.881, 99.899, 99.915, 99.928, 99.939, 99.949, 99.957, 99.963, 99.969, 99.974, 99.978, 99.981, 99.984, 99.987, 99.989, 99.99, 99.992, 99.993, 99.994, 99.995, 99.996, 99.997],
+    'Predicted 5-Year Probability of Death (%)': [0.483, 0.551, 0.629, 0.717, 0.818, 0.934, 1.065, 1.214, 1.384, 1.578, 1.798, 2.048, 2.333, 2.655, 3.021, 3.435, 3.904, 4.435, 5.033, 5.707, 6.466, 7.317, 8.27, 9.336, 10.522, 11.84, 13.299, 14.907, 16.671, 18.599, 20.695, 22.96, 25.393, 27.991, 30.745, 33.644, 36.671, 39.807, 43.029, 46.311, 49.625, 52.943, 56.234, 59.472, 62.63, 65.683, 68.612, 71.4, 74.034, 76.505, 78.809, 80.942, 82.908, 84.709, 86.351, 87.843, 89.192, 90.407, 91.499, 92.477, 93.351, 94.129, 94.822, 95.436, 95.981, 96.464, 96.89, 97.266, 97.598, 97.891, 98.148, 98.375, 98.574, 98.749, 98.903, 99.038, 99.157, 99.261, 99.352, 99.432, 99.503, 99.564, 99.618, 99.666, 99.707, 99.743, 99.775, 99.803, 99.828, 99.849, 99.868, 99.884, 99.899, 99.911, 99.922, 99.932, 99.94, 99.948, 99.954, 99.96, 99.965, 99.969, 99.973, 99.976, 99.979, 99.982, 99.984, 99.986]
+}
+
+os_prob_data = pd.DataFrame(os_data)
+
+def os_calculate_risk_score(who_grade, tstage, cirrhosis, portal_hyp, hepar, gpc, r_rpa):
+    score = 0
+    score += {1: 0, 2: 11, 3: 34}.get(who_grade, 0)
+    score += {1: 0, 2: 0, 3: 9, 4: 16}.get(tstage, 0)
+    score += {False: 0, True: 6}.get(cirrhosis, 0)
+    score += {False: 0, True: 11}.get(portal_hyp, 0)
+    
+    # Calculate Hepar/GPC category score
+    if hepar == "high" and gpc == "negative":
+        score += 0
+    elif (hepar == "high" and gpc == "positive") or (hepar == "low" and gpc == "negative"):
+        score += 1
+    elif hepar == "low" and gpc == "positive":
+        score += 10
+    
+    score += -3 * round(int(r_rpa) / 10)
+    return score
+
+def os_get_risk_probabilities(score, prob_data):
+    if score in prob_data['Risk Score'].values:
+        risk_3yr = prob_data[prob_data['Risk Score'] == score]['Predicted 3-Year Probability of Death (%)'].values[0]
+        risk_5yr = prob_data[prob_data['Risk Score'] == score]['Predicted 5-Year Probability of Death (%)'].values[0]
+        survival_3yr = 100 - risk_3yr
+        survival_5yr = 100 - risk_5yr
+        return risk_3yr, risk_5yr, survival_3yr, survival_5yr
+    else:
+        return "Score out of range.", "Score out of range.", "Score out of range.", "Score out of range."
+
+# EoE.py
+eoe_coef_str = [0.044]
+
+eoe_intercept_str = -3.9
+
+eoe_coef_dil = [0.041]
+
+eoe_intercept_dil = -3.7
+
+eoe_coef_rng = [0.034]
+
+eoe_intercept_rng = -2.1
+
+def eoe_calculate_scores(age, duration, eos, fib, remodel):
+    age_scaled = min(age // 10, 8)
+    duration_scaled = min(duration, 15)
+    eos_scaled = min(eos // 10, 10)
+    fib_scaled = min(fib // 10, 30)
+    remodel_scaled = min(remodel // 100, 50)
+
+    score_str = fib_scaled * 2 + eos_scaled * 1 + age_scaled * 2 + duration_scaled * 4 + remodel_scaled * 1
+    score_dil = fib_scaled * 2 + eos_scaled * 1 + age_scaled * 2 + duration_scaled * 4 + remodel_scaled * 1
+    score_rng = fib_scaled * 1 + eos_scaled * 2 + age_scaled * 1 + duration_scaled * 1 + remodel_scaled * 1
+
+    return score_str, score_dil, score_rng
+
+def eoe_predict_probability(score, coef, intercept):
+    log_odds = coef[0] * score + intercept
+    return 1 / (1 + np.exp(-log_odds))
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import bulk_score
+import os_model
+
+PATIENTS = pd.DataFrame({
+    'who_grade': [1, 2, 3], 'tstage': [1, 2, 4], 'cirrhosis': [False, True, False], 'portal_hyp': [False, False, True],
+    'hepar': ['high', 'low', 'high'], 'gpc': ['negative', 'positive', 'negative'], 'r_rpa': [10, 40, 90],
+})
+
+def read(path):
+    return pd.read_parquet(path) if bulk_score.is_parquet(path) else pd.read_csv(path)
+
+# Chunks with no rows (all filtered out, or unchanged in an incremental run) can
+# come first; the header is written once and the Parquet schema comes from the
+# first chunk with rows
+@pytest.mark.parametrize('suffix', ['csv', 'parquet'])
+def test_leading_empty_chunks(tmp_path, suffix):
+    if suffix == 'parquet':
+        pytest.importorskip('pyarrow')
+    scored = bulk_score.score_chunk('os', PATIENTS)
+    path = tmp_path / f'scored.{suffix}'
+    assert bulk_score.write_chunks(path, [scored.iloc[:0], scored.iloc[:0], scored.iloc[:2], scored.iloc[2:]]) == 3
+    pd.testing.assert_frame_equal(read(path), scored, check_dtype=False)
+
+    assert bulk_score.write_chunks(path, [scored.iloc[:0]]) == 0
+    assert list(read(path).columns) == list(scored.columns)
+
+# A text column with no values in a later chunk is read from CSV as float64
+def test_parquet_chunks_are_cast_to_the_first_schema(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    notes = PATIENTS.assign(note=['a', 'b', 'c'])
+    chunks = [notes.iloc[:2], notes.iloc[2:].assign(note=np.nan)]
+    path = tmp_path / 'scored.parquet'
+    assert bulk_score.write_chunks(path, chunks) == 3
+    assert pq.read_table(path).column('note').to_pylist() == ['a', 'b', None]
+
+def test_run_matches_score_batch(tmp_path):
+    source = tmp_path / 'cohort.csv'
+    PATIENTS.to_csv(source, index=False)
+    assert bulk_score.run('os', source, tmp_path / 'scored.csv', chunksize=2) == 3
+    scored = read(tmp_path / 'scored.csv')
+    for column, values in os_model.score_batch(PATIENTS).items():
+        np.testing.assert_allclose(scored[column], values)
@@ -0,0 +1,73 @@
+import copy
+
+import pandas as pd
+import pytest
+
+import incremental
+import os_model
+import scoring
+from spec_engine import compile_spec
+
+pytest.importorskip('pyarrow')
+
+PATIENTS = pd.DataFrame({
+    'patient_id': ['a', 'b', 'c', 'd'],
+    'who_grade': [1, 2, 3, 1], 'tstage': [1, 2, 4, 3], 'cirrhosis': [False, True, False, True],
+    'portal_hyp': [False, False, True, True], 'hepar': ['high', 'low', 'high', 'low'],
+    'gpc': ['negative', 'positive', 'negative', 'positive'], 'r_rpa': [10, 40, 90, 0],
+})
+
+def run(tmp_path, patients, **options):
+    source = tmp_path / 'cohort.csv'
+    output = tmp_path / 'scored.csv'
+    patients.to_csv(source, index=False)
+    rows, skipped = incremental.run('os', source, output, tmp_path / 'store', **options)
+    return rows, skipped, pd.read_csv(output, dtype={'patient_id': str})
+
+def stored(tmp_path):
+    return pd.read_parquet(tmp_path / 'store' / 'os.parquet').set_index('patient_id')
+
+def expected(patients):
+    return pd.DataFrame(os_model.score_batch(patients), index=patients['patient_id'])
+
+def test_unchanged_rerun_skips_every_row(tmp_path):
+    assert run(tmp_path, PATIENTS)[:2] == (4, 0)
+    rows, skipped, scored = run(tmp_path, PATIENTS)
+    assert (rows, skipped) == (4, 4)
+    pd.testing.assert_frame_equal(scored.set_index('patient_id')[os_model.OUTPUT_COLUMNS], expected(PATIENTS),
+                                  check_dtype=False, check_names=False)
+
+def test_changed_rows_are_rescored(tmp_path):
+    run(tmp_path, PATIENTS)
+    changed = PATIENTS.assign(r_rpa=[10, 40, 50, 0])
+    rows, skipped, scored = run(tmp_path, changed)
+    assert (rows, skipped) == (4, 3)
+    assert scored.set_index('patient_id').loc['c', 'risk_score'] == expected(changed).loc['c', 'risk_score']
+
+    # --changed-only writes just the re-scored rows
+    rows, skipped, scored = run(tmp_path, PATIENTS, changed_only=True)
+    assert (rows, skipped) == (1, 3)
+    assert scored['patient_id'].tolist() == ['c']
+
+def test_partial_input_keeps_unseen_patients(tmp_path):
+    run(tmp_path, PATIENTS)
+    rows, skipped, scored = run(tmp_path, PATIENTS.iloc[:2])
+    assert (rows, skipped) == (2, 2)
+    assert sorted(stored(tmp_path).index) == ['a', 'b', 'c', 'd']
+    assert stored(tmp_path).loc['d', 'risk_score'] == expected(PATIENTS).loc['d', 'risk_score']
+
+    # --prune drops them
+    run(tmp_path, PATIENTS.iloc[:2], prune=True)
+    assert sorted(stored(tmp_path).index) == ['a', 'b']
+
+def test_spec_change_rescores_every_row(tmp_path, monkeypatch):
+    run(tmp_path, PATIENTS)
+    spec = copy.deepcopy(os_model.model.spec)
+    spec['scores']['risk_score']['terms'][0]['points'] = [[value, points + 1] for value, points in spec['scores']['risk_score']['terms'][0]['points']]
+    edited = compile_spec(spec)
+    monkeypatch.setitem(scoring.MODELS, 'os', edited)
+
+    rows, skipped, scored = run(tmp_path, PATIENTS)
+    assert (rows, skipped) == (4, 0)
+    assert scored['risk_score'].tolist() == edited.score_batch(PATIENTS)['risk_score'].tolist()
+    assert (stored(tmp_path)['model_hash'] == incremental.model_hash(edited)).all()
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What importing a page's modules compiles: the page runs these imports on its
+# first visit, and only its own model should be loaded then
+IMPORTS = """
+import ast, os, sys
+import spec_engine
+tree = ast.parse(open(sys.argv[1]).read())
+for node in tree.body:
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        exec(compile(ast.Module([node], []), sys.argv[1], 'exec'))
+print(' '.join(sorted(os.path.basename(path) for path in spec_engine._loaded)))
+"""
+
+@pytest.mark.parametrize('page, spec', [('app.py', 'recmet.json'), ('DFS.py', 'dfs.json'), ('OS.py', 'os.json'), ('EoE.py', 'eoe.json')])
+def test_pages_only_load_their_own_model(page, spec):
+    result = subprocess.run([sys.executable, '-c', IMPORTS, page], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == [spec]
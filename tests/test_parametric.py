@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import dfs_model
+import os_model
+import recmet_model
+from parametric import fit_error, fit_logistic
+
+# The tables stay the reference for the fitted curves: every curve must match
+# its table to within the table's rounding (rec-met is rounded to 0.1 points)
+MAX_ERROR = {recmet_model: 0.06, dfs_model: 0.001, os_model: 0.001}
+MODELS = list(MAX_ERROR)
+YEARS = (3, 5)
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: model.__name__)
+@pytest.mark.parametrize('year', YEARS)
+def test_fit_matches_table(model, year):
+    max_error, _ = fit_error(model, year)
+    assert max_error <= MAX_ERROR[model]
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: model.__name__)
+@pytest.mark.parametrize('year', YEARS)
+def test_shipped_fit_is_the_refit(model, year):
+    table = model.prob_table
+    scores = np.arange(table.min_score, table.max_score + 1)
+    coef, intercept = fit_logistic(scores, table.values(year))
+    assert table.fits[year] == pytest.approx((coef[0], intercept), abs=1e-5)
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: model.__name__)
+@pytest.mark.parametrize('year', YEARS)
+def test_table_scores_come_from_the_table(model, year):
+    table = model.prob_table
+    scores = np.arange(table.min_score, table.max_score + 1)
+    np.testing.assert_array_equal(table.lookup(scores, year, 'fit'), table.values(year))
+    assert [table.lookup(int(score), year, 'fit') for score in scores] == table.values(year).tolist()
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: model.__name__)
+@pytest.mark.parametrize('year', YEARS)
+def test_out_of_range_scores_come_from_the_fit(model, year):
+    table = model.prob_table
+    outside = np.array([table.min_score - 20, table.min_score - 1, table.max_score + 1, table.max_score + 20])
+    expected = model.predict_probability(outside, year)
+    np.testing.assert_allclose(table.lookup(outside, year, 'fit'), expected)
+    assert table.lookup(int(outside[0]), year, 'fit') == pytest.approx(expected[0])
+    assert np.isnan(table.lookup(outside, year, 'nan')).all()
+    with pytest.raises(ValueError):
+        table.lookup(outside, year)
+
+# A patient whose score is above every table: the scalar and batch scorers and
+# the page helpers all serve the fitted curve instead of "Score out of range."
+def test_out_of_range_patient():
+    patient = {'who_grade': 3, 'tstage': 4, 'cirrhosis': True, 'portal_hyp': True,
+               'hepar': 'low', 'gpc': 'positive', 'r_rpa': -200}
+    args = [patient[column] for column in os_model.INPUT_COLUMNS]
+    result = os_model.score_patient(*args)
+    assert result['risk_score'] > os_model.prob_table.max_score
+    assert result['death_3yr'] == pytest.approx(os_model.predict_probability(result['risk_score'], 3))
+    assert result['survival_5yr'] == pytest.approx(100 - os_model.predict_probability(result['risk_score'], 5))
+
+    batch = os_model.score_batch({column: [value] for column, value in patient.items()})
+    assert batch['death_3yr'][0] == pytest.approx(result['death_3yr'])
+    assert np.isnan(os_model.score_batch({column: [value] for column, value in patient.items()}, 'nan')['death_3yr'][0])
+
+    risk_3yr, risk_5yr, survival_3yr, survival_5yr = os_model.get_risk_probabilities(result['risk_score'])
+    assert (risk_3yr, survival_5yr) == pytest.approx((result['death_3yr'], result['survival_5yr']))
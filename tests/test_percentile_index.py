@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+import os_model
+from percentile_index import PercentileIndex
+
+COMPLETE = {
+    'who_grade': [1, 2, 3], 'tstage': [1, 2, 4], 'cirrhosis': [False, True, False], 'portal_hyp': [False, False, True],
+    'hepar': ['high', 'low', 'high'], 'gpc': ['negative', 'positive', 'negative'], 'r_rpa': [10, 40.5, 90],
+}
+
+# Patients with a missing or infinite input are left out of the reference cohort
+# instead of being ranked with a garbage score
+def test_build_leaves_out_missing_inputs(tmp_path):
+    cohort = pd.DataFrame(COMPLETE)
+    gaps = pd.concat([cohort.iloc[[0]]] * 3, ignore_index=True)
+    gaps.loc[0, 'r_rpa'] = np.nan
+    gaps.loc[1, 'hepar'] = None
+    gaps.loc[2, 'r_rpa'] = np.inf
+    path = tmp_path / 'cohort.csv'
+    pd.concat([cohort, gaps], ignore_index=True).to_csv(path, index=False)
+
+    index = PercentileIndex.build('os', path)
+    expected = np.sort(os_model.score_batch(COMPLETE)['risk_score'])
+    np.testing.assert_array_equal(index.scores, expected)
+
+    index.save(tmp_path)
+    assert PercentileIndex.load('os', tmp_path).scores.tolist() == expected.tolist()
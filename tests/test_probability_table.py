@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import os_model
+import parallel
+import scoring
+from probability_table import ProbabilityTable
+
+SCORES = np.arange(-2, 3)
+DECIMALS = [0.043, 13.555, 49.962, 99.997, 100.0]
+
+def test_decimal_columns_are_stored_as_float32():
+    table = ProbabilityTable(SCORES, {'risk': DECIMALS, 'rounded': [6.9, 7.6, 8.4, 9.4, 10.4]})
+    assert table.scores.dtype == np.int16
+    assert table.columns['risk'].dtype == np.float32
+    assert table.decimals == {'risk': 3, 'rounded': 1}
+    assert [table.lookup(int(score), 'risk') for score in SCORES] == DECIMALS
+    assert table.lookup(SCORES, 'risk').tolist() == DECIMALS
+    assert table.lookup(SCORES, 'rounded').tolist() == [6.9, 7.6, 8.4, 9.4, 10.4]
+    assert table.values('risk').tolist() == DECIMALS
+    assert table.lookup(5, 'risk', 'clip') == 100.0
+
+def test_other_columns_stay_float64():
+    values = [1 / 3, 2 / 3, 1.0, 4 / 3, 5 / 3]
+    table = ProbabilityTable(SCORES, {'risk': values})
+    assert table.columns['risk'].dtype == np.float64
+    assert table.decimals == {'risk': None}
+    assert table.lookup(SCORES, 'risk').tolist() == values
+    assert table.lookup(0, 'risk') == values[2]
+
+def test_columns_are_read_only_and_shared():
+    values = np.array(DECIMALS)
+    table = ProbabilityTable(SCORES, {'risk': values})
+    values[0] = 50
+    assert table.lookup(-2, 'risk') == 0.043
+    with pytest.raises(ValueError):
+        table.columns['risk'][0] = 50
+    assert table.view({3: 'risk'}).columns[3] is table.columns['risk']
+
+def test_shared_memory_tables_are_not_copied():
+    table = os_model.model.tables['risk_score']
+    shm, shared = parallel.share_table(table)
+    try:
+        attached = parallel.attach_table(*shared)
+        mapped = np.ndarray(shared[4], dtype=shared[3], buffer=parallel._attached[-1].buf)
+        for key in table.columns:
+            assert np.shares_memory(attached.columns[key], mapped)
+            assert attached.values(key).tolist() == table.values(key).tolist()
+        assert attached.fits == table.fits
+    finally:
+        parallel._attached.pop().close()
+        shm.close()
+        shm.unlink()
+
+def test_score_records():
+    patients = {
+        'who_grade': [1, 3], 'tstage': [1, 4], 'cirrhosis': [False, True], 'portal_hyp': [False, True],
+        'hepar': ['high', 'low'], 'gpc': ['negative', 'positive'], 'r_rpa': [0, -200],
+    }
+    records = os_model.score_records(patients)
+    assert records.dtype.names == tuple(os_model.OUTPUT_COLUMNS)
+    results = os_model.score_batch(patients)
+    for column in os_model.OUTPUT_COLUMNS:
+        np.testing.assert_array_equal(records[column], results[column])
+
+    # Scores without a probability come back as None in the API's records
+    rows = scoring._to_rows(os_model.score_records(patients, 'nan'))
+    assert rows[0] == tuple(records[0].tolist())
+    assert rows[1][0] == records['risk_score'][1] and rows[1][1:] == (None,) * 4
+
+# The fitted curves only serve scores near the table; garbage and non-finite
+# scores are NaN rather than a plausible probability
+def test_fit_is_limited_to_the_fit_range():
+    table = ProbabilityTable(SCORES, {'risk': DECIMALS}, fits={'risk': (1.0, 0.0)})
+    assert table.fit_range == (-7, 7)
+    scores = np.array([-8, -7, 0, 7, 8, np.iinfo(np.int64).min])
+    result = table.lookup(scores, 'risk', 'fit')
+    assert np.isnan(result[[0, 4, 5]]).all()
+    assert result[1] == table.fitted(-7, 'risk') and result[2] == 49.962 and result[3] == table.fitted(7, 'risk')
+    assert [table.lookup(int(score), 'risk', 'fit') for score in scores[1:4]] == result[1:4].tolist()
+    assert np.isnan(table.lookup(8, 'risk', 'fit'))
+
+    for policy in ('nan', 'fit'):
+        assert np.isnan(table.lookup(float('nan'), 'risk', policy))
+        assert np.isnan(table.lookup(np.array([0.0, np.nan, np.inf]), 'risk', policy)[1:]).all()
+    with pytest.raises(ValueError):
+        table.lookup(np.array([0.0, np.nan]), 'risk', 'clip')
+
+def test_score_patient_beyond_the_fit_range():
+    patient = (1, 1, False, False, 'high', 'negative', -1000)
+    results = os_model.model.score_patient(*patient)
+    assert results['risk_score'] > os_model.prob_table.fit_range[1]
+    assert results['death_3yr'] == os_model.model.out_of_range
+    columns = {column: [value] for column, value in zip(os_model.INPUT_COLUMNS, patient)}
+    assert np.isnan(os_model.score_batch(columns)['death_3yr'][0])
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import async_server
+import server
+
+PATIENT = {'who_grade': 1, 'tstage': 2, 'cirrhosis': False, 'portal_hyp': True, 'hepar': 'high', 'gpc': 'negative', 'r_rpa': 10}
+
+def test_handle():
+    status, payload = server.handle('POST', '/score/os', json.dumps(PATIENT).encode())
+    assert status == 200 and payload['risk_score'] == 8
+    assert server.handle('POST', '/batch/os', json.dumps({'patients': [PATIENT]}).encode())[1]['results'][0] == payload
+    assert server.handle('POST', '/score/os', b'{')[0] == 400
+    assert server.handle('POST', '/score/os', json.dumps({**PATIENT, 'r_rpa': None}).encode())[0] == 400
+    assert server.handle('POST', '/batch/os', json.dumps({'patients': [{**PATIENT, 'r_rpa': None}]}).encode())[0] == 400
+    assert server.handle('POST', '/score/nope', b'{}')[0] == 404
+
+# NaN and Infinity are not JSON; scoring them gave a 200 with a literal NaN
+@pytest.mark.parametrize('value', ['NaN', 'Infinity', '-Infinity', '1e999'])
+def test_handle_rejects_non_finite_numbers(value):
+    body = json.dumps({**PATIENT, 'r_rpa': 0}).replace('"r_rpa": 0', f'"r_rpa": {value}').encode()
+    assert value.encode() in body
+    status, payload = server.handle('POST', '/score/os', body)
+    assert status == 400 and 'Invalid JSON body' in payload['error']
+    eoe = f'{{"age": {value}, "duration": 1, "eos": 10, "fib": 10, "remodel": 100}}'.encode()
+    assert server.handle('POST', '/score/eoe', eoe)[0] == 400
+    assert server.handle('POST', '/batch/os', b'{"patients": [%s]}' % body)[0] == 400
+
+@pytest.mark.parametrize('content_length, transfer_encoding, status', [
+    ('12', None, None), (None, None, None), ('twelve', None, 400), ('-1', None, 400),
+    (str(server.MAX_BODY + 1), None, 413), (None, 'chunked', 411), ('12', 'gzip, chunked', 411), (None, 'gzip', 501),
+])
+def test_content_length(content_length, transfer_encoding, status):
+    length, error = server.content_length(content_length, transfer_encoding)
+    if status is None:
+        assert (length, error) == (int(content_length or 0), None)
+    else:
+        assert length is None and error[0] == status
+
+@pytest.fixture
+def threaded_port():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), server.ScoringHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def async_port():
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(asyncio.start_server(async_server.serve_connection, '127.0.0.1', 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield listener.sockets[0].getsockname()[1]
+    loop.call_soon_threadsafe(listener.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+# Send raw bytes on one connection and return the (status, payload) of every
+# response read before the server closes it
+def exchange(port, data):
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as connection:
+        connection.sendall(data)
+        received = b''
+        while chunk := connection.recv(65536):
+            received += chunk
+    responses = []
+    while received:
+        head, _, rest = received.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        headers = {name.lower(): value.strip() for name, _, value in (line.partition(':') for line in lines[1:])}
+        length = int(headers['content-length'])
+        responses.append((int(lines[0].split()[1]), json.loads(rest[:length])))
+        received = rest[length:]
+    return responses
+
+def post(body, headers=''):
+    return f'POST /score/os HTTP/1.1\r\nHost: test\r\n{headers}\r\n'.encode() + body
+
+BODY = json.dumps(PATIENT).encode()
+LAST = b'GET /health HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n'
+
+@pytest.mark.parametrize('port', ['threaded_port', 'async_port'])
+def test_round_trips(port, request):
+    port = request.getfixturevalue(port)
+    # Keep-alive requests on one connection
+    responses = exchange(port, post(BODY, f'Content-Length: {len(BODY)}\r\n') + LAST)
+    assert [status for status, _ in responses] == [200, 200]
+    assert responses[0][1]['risk_score'] == 8
+
+    # Unreadable bodies are answered and the connection is closed, so nothing
+    # after them is parsed as another request
+    for headers, status in [('Content-Length: twelve\r\n', 400), ('Content-Length: -5\r\n', 400),
+                            (f'Content-Length: {server.MAX_BODY + 1}\r\n', 413)]:
+        responses = exchange(port, post(BODY, headers) + LAST)
+        assert [response[0] for response in responses] == [status]
+
+    chunked = b'%x\r\n%s\r\n0\r\n\r\n' % (len(BODY), BODY)
+    responses = exchange(port, post(chunked, 'Transfer-Encoding: chunked\r\n') + LAST)
+    assert [response[0] for response in responses] == [411]
+    assert 'Content-Length' in responses[0][1]['error']
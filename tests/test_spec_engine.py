@@ -0,0 +1,220 @@
+import copy
+import itertools
+import math
+import random
+import traceback
+
+import numpy as np
+import pytest
+
+import dfs_model
+import eoe_model
+import os_model
+import recmet_model
+import reference_calculators as reference
+from spec_engine import compile_spec
+
+# The compiled models must give the original calculators' outputs for every
+# position of the pages' widgets, plus off-grid values the API accepts
+# (fractional percentages, band edges and NaN nuclear area)
+PERCENT_SLIDER = [float(value) for value in range(101)]
+OFF_GRID = [0.5, 2.5, 5.0, 14.999, 15.5, 19.999, 24.999, 25.0001, 44.5, 45.5, 99.9, float('nan')]
+WHO_GRADES = [1, 2, 3]
+T_STAGES = [1, 2, 3, 4]
+BOOLEANS = [False, True]
+
+GRIDS = {
+    'recmet': (recmet_model, reference.recmet_calculate_risk_score, {
+        'who_grade': WHO_GRADES, 't_stage': T_STAGES, 'hepar': ['high', 'low'], 'gpc': ['+', '-'],
+        'nuclear_area': PERCENT_SLIDER + OFF_GRID, 'r_rpa': PERCENT_SLIDER + OFF_GRID[:-1],
+    }),
+    'dfs': (dfs_model, reference.dfs_calculate_risk_score, {
+        'who_grade': WHO_GRADES, 'tstage': T_STAGES, 'multifocality': BOOLEANS,
+        'nuclear_area': PERCENT_SLIDER + OFF_GRID, 'r_rpa': list(range(101)) + OFF_GRID[:-1],
+        'hepar': ['high', 'low'], 'gpc': ['negative', 'positive'],
+    }),
+    'os': (os_model, reference.os_calculate_risk_score, {
+        'who_grade': WHO_GRADES, 'tstage': T_STAGES, 'cirrhosis': BOOLEANS, 'portal_hyp': BOOLEANS,
+        'hepar': ['high', 'low'], 'gpc': ['negative', 'positive'], 'r_rpa': list(range(101)) + OFF_GRID[:-1],
+    }),
+}
+
+# Values are compared as the pages print them, so 5 and 5.0 differ
+def same(ours, theirs):
+    if isinstance(theirs, float) and math.isnan(theirs):
+        return math.isnan(ours)
+    return ours == theirs and str(ours) == str(theirs)
+
+def grid_rows(model, grid):
+    assert list(grid) == model.INPUT_COLUMNS
+    return list(itertools.product(*grid.values()))
+
+def grid_columns(rows):
+    return [np.array(column) for column in zip(*rows)]
+
+@pytest.mark.parametrize('name', sorted(GRIDS))
+def test_hcc_scores(name):
+    model, calculate, grid = GRIDS[name]
+    rows = grid_rows(model, grid)
+    expected = [calculate(*row) for row in rows]
+
+    scalar = [model.calculate_risk_score(*row) for row in rows]
+    mismatches = [(row, ours, theirs) for row, ours, theirs in zip(rows, scalar, expected) if not same(ours, theirs)]
+    assert not mismatches, mismatches[:5]
+
+    batch = model.calculate_risk_scores(*grid_columns(rows))
+    np.testing.assert_array_equal(batch, expected)
+
+@pytest.mark.parametrize('name', sorted(GRIDS))
+def test_hcc_probabilities(name):
+    model = GRIDS[name][0]
+    prob_data = getattr(reference, f'{name}_prob_data')
+    for score in prob_data['Risk Score']:
+        score = int(score)
+        if name == 'recmet':
+            ours = [model.get_risk_probability(score, year) for year in (3, 5)]
+            theirs = [reference.recmet_get_risk_probability(score, prob_data, year) for year in (3, 5)]
+        else:
+            ours = model.get_risk_probabilities(score)
+            theirs = getattr(reference, f'{name}_get_risk_probabilities')(score, prob_data)
+        assert all(same(a, b) for a, b in zip(ours, theirs)), (score, ours, theirs)
+
+    # score_patient and score_batch map every reachable score like the page does
+    rows = random.Random(0).sample(grid_rows(model, GRIDS[name][2]), 2000)
+    results = model.score_batch(dict(zip(model.INPUT_COLUMNS, grid_columns(rows))))
+    outputs = [column for column in model.OUTPUT_COLUMNS if column != 'risk_score']
+    for index, row in enumerate(rows):
+        patient = model.score_patient(*row)
+        score = patient['risk_score']
+        if name == 'recmet':
+            expected = [reference.recmet_get_risk_probability(score, prob_data, year) for year in (3, 5)]
+        else:
+            risk_3yr, risk_5yr, survival_3yr, survival_5yr = getattr(reference, f'{name}_get_risk_probabilities')(score, prob_data)
+            expected = [risk_3yr, risk_5yr, survival_3yr, survival_5yr]
+        assert [patient[column] for column in outputs] == expected
+        assert [results[column][index] for column in outputs] == expected
+
+EOE_RANGES = {'age': 80, 'duration': 15, 'eos': 100, 'fib': 300, 'remodel': 5000}
+
+# Every value of each EoE slider, with the other sliders at random positions, and
+# random patients over the whole input space
+def eoe_rows():
+    rng = random.Random(0)
+    rows = []
+    for column, top in EOE_RANGES.items():
+        for value in range(top + 1):
+            for _ in range(3):
+                patient = {name: rng.randint(0, high) for name, high in EOE_RANGES.items()}
+                patient[column] = value
+                rows.append(tuple(patient.values()))
+    rows.extend(tuple(rng.randint(0, high) for high in EOE_RANGES.values()) for _ in range(100_000))
+    return rows
+
+def test_eoe_scores_and_probabilities():
+    rows = eoe_rows()
+    expected = [reference.eoe_calculate_scores(*row) for row in rows]
+    assert [eoe_model.calculate_scores(*row) for row in rows] == expected
+
+    batch = eoe_model.calculate_scores_batch(*grid_columns(rows))
+    for ours, theirs in zip(batch, zip(*expected)):
+        np.testing.assert_array_equal(ours, theirs)
+
+    curves = {
+        'p_str': (reference.eoe_coef_str, reference.eoe_intercept_str),
+        'p_dil': (reference.eoe_coef_dil, reference.eoe_intercept_dil),
+        'p_rng': (reference.eoe_coef_rng, reference.eoe_intercept_rng),
+    }
+    scores = dict(zip(['p_str', 'p_dil', 'p_rng'], batch))
+    for output, (coef, intercept) in curves.items():
+        for score in np.unique(scores[output]).tolist():
+            assert same(eoe_model.predict_probability(score, output), reference.eoe_predict_probability(score, coef, intercept))
+        np.testing.assert_array_equal(
+            eoe_model.predict_probability(scores[output], output),
+            reference.eoe_predict_probability(scores[output], coef, intercept),
+        )
+
+    for row in rows[:2000]:
+        patient = eoe_model.score_patient(*row)
+        for output, (coef, intercept) in curves.items():
+            score = patient[f'score_{output[2:]}']
+            assert same(patient[output], reference.eoe_predict_probability(score, coef, intercept))
+
+# The model modules expose the compiled model's tables rather than copies
+@pytest.mark.parametrize('model', [recmet_model, dfs_model, os_model], ids=lambda model: model.__name__)
+def test_wrappers_share_the_compiled_tables(model):
+    table = model.model.tables['risk_score']
+    for year in (3, 5):
+        column = model.prob_table.columns[year]
+        assert any(column is values for values in table.columns.values())
+        assert not column.flags.writeable
+    assert not hasattr(model, 'prob_data')
+    assert not hasattr(model, 'data')
+
+# A missing r-RPA cannot be scored; the batch scorers raise for it like the
+# scalar ones instead of casting NaN to an arbitrary integer score
+@pytest.mark.parametrize('name', sorted(GRIDS))
+@pytest.mark.parametrize('missing', [None, float('nan'), float('inf')])
+def test_hcc_batch_rejects_missing_slope_inputs(name, missing):
+    model, _, grid = GRIDS[name]
+    columns = dict(zip(model.INPUT_COLUMNS, [list(column) for column in zip(*grid_rows(model, grid)[:3])]))
+    columns['r_rpa'][1] = missing
+    with pytest.raises(ValueError, match="'r_rpa' has 1 missing"):
+        model.score_batch(columns)
+
+    # A missing nuclear area scores its own band, as in the scalar scorer
+    if 'nuclear_area' in columns:
+        columns['r_rpa'][1] = 0
+        columns['nuclear_area'] = [float('nan')] * 3
+        expected = [model.calculate_risk_score(*row) for row in zip(*columns.values())]
+        assert model.score_batch(columns)['risk_score'].tolist() == expected
+
+SPEC = {
+    'name': 'toy',
+    'inputs': ['grade', 'size'],
+    'scores': {'score': {'dtype': 'int', 'terms': [
+        {'type': 'map', 'input': 'grade', 'points': [[1, 0], [2, 5]]},
+        {'type': 'rules', 'rules': [{'when': {'grade': 2, 'size': 0}, 'points': 1}]},
+        {'type': 'bands', 'input': 'size', 'edges': [10, 20], 'points': [0, 2, 4]},
+        {'type': 'slope', 'input': 'size', 'per': 10, 'points': 1, 'round': 'floor'},
+    ]}},
+    'probabilities': [
+        {'output': 'risk', 'score': 'score', 'table': {'min_score': 0, 'values': [1.0, 2.0, 3.0]}},
+        {'output': 'other', 'score': 'score', 'table': {'min_score': 0, 'values': [4.0, 5.0, 6.0]}},
+    ],
+}
+
+# Edit a copy of SPEC: the term at index `term`, or the spec itself
+def edited(term=None, **changes):
+    spec = copy.deepcopy(SPEC)
+    (spec['scores']['score']['terms'][term] if term is not None else spec).update(changes)
+    return spec
+
+def test_valid_spec():
+    model = compile_spec(SPEC)
+    assert model.scorer('score')(2, 15) == 8
+    assert model.score_batch({'grade': [1, 2], 'size': [0, 15]})['score'].tolist() == [0, 8]
+
+@pytest.mark.parametrize('spec, message', [
+    (edited(0, type='lookup'), "Unknown term type 'lookup'"),
+    (edited(0, input='stage'), "unknown input 'stage'"),
+    (edited(1, rules=[{'when': {'stage': 1}, 'points': 1}]), r"unknown inputs \['stage'\]"),
+    (edited(2, edges=[20, 10]), "must be in ascending order"),
+    (edited(2, points=[0, 2]), "one more points value than edges"),
+    (edited(3, round='half_up'), "Unknown rounding 'half_up'"),
+    (edited(inputs=['grade', 'size', 'np']), "Input name 'np'"),
+    (edited(inputs=['grade', 'size', '_private']), "Input name '_private'"),
+    (edited(inputs=['grade', 'size', 'class']), "Input name 'class'"),
+    (edited(probabilities=[{'output': 'risk', 'score': 'total', 'table': {'min_score': 0, 'values': [1.0]}}]),
+     "refers to unknown score 'total'"),
+    (edited(probabilities=[SPEC['probabilities'][0], {**SPEC['probabilities'][1], 'table': {'min_score': 1, 'values': [4.0, 5.0, 6.0]}}]),
+     "must share the same min_score"),
+])
+def test_invalid_specs(spec, message):
+    with pytest.raises(ValueError, match=message):
+        compile_spec(spec)
+
+# Tracebacks through a compiled scorer show its generated source
+def test_scorer_tracebacks_show_the_source():
+    with pytest.raises(TypeError) as error:
+        compile_spec(SPEC).scorer('score')(1, None)
+    assert 'size' in ''.join(traceback.format_tb(error.tb)[-1:])